@@ -1,14 +1,50 @@
 #app.py
-from flask import Flask
+import time
+from flask import Flask, jsonify, request, g, Response
 from routes.auth_routes import auth_bp
 from routes.blockchain_routes import blockchain_bp
 from routes.accounts_routes import accounts_bp
+from utils.crypto_executor import CryptoBusyError
+from models.mempool import MempoolFullError, AccountQueueFullError
+from db_indexes import bootstrap as bootstrap_indexes
+from utils.metrics import registry, http_request_seconds, server_timing
 
 app = Flask(__name__)
+bootstrap_indexes()
 
 app.register_blueprint(auth_bp, url_prefix="/api/auth")
 app.register_blueprint(blockchain_bp, url_prefix="/api/blockchain")
 app.register_blueprint(accounts_bp, url_prefix="/api/accounts")
 
+@app.before_request
+def start_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request(response):
+    started = g.get("request_started")
+    if started is not None:
+        elapsed = time.perf_counter() - started
+        # The rule, not the raw path, so ids in URLs don't explode the label set
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        http_request_seconds.observe(elapsed, request.method, route, str(response.status_code))
+        for entry in server_timing() + [f"total;dur={round(elapsed * 1000, 3)}"]:
+            response.headers.add("Server-Timing", entry)
+    return response
+
+@app.route("/metrics")
+def metrics():
+    return Response(registry.render(), mimetype="text/plain; version=0.0.4")
+
+@app.errorhandler(CryptoBusyError)
+def crypto_busy(e):
+    return jsonify({"error": "Server is busy, please retry"}), 503
+
+@app.errorhandler(MempoolFullError)
+def mempool_full(e):
+    # A full per-account queue is the caller's backlog; a full pool is ours
+    status = 429 if isinstance(e, AccountQueueFullError) else 503
+    return jsonify({"error": f"{e}, please retry"}), status
+
 if __name__ == "__main__":
     app.run(debug=True)
\ No newline at end of file
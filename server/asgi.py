@@ -0,0 +1,194 @@
+# asgi.py
+"""Async serving mode.
+
+The lightweight read endpoints (account verify/details, balance, history)
+are answered on the event loop with the Motor driver, so thousands of them
+can wait on MongoDB at once. Everything else, including the crypto and
+mining paths, falls through to the Flask app on a thread pool.
+
+Run with `SERVE_MODE=asgi python serve.py` or `uvicorn asgi:application`.
+"""
+import asyncio
+import os
+import time
+from urllib.parse import parse_qs
+from dotenv import load_dotenv
+from app import app as flask_app
+from db import STALE_READS
+from db_async import get_async_db, close_async_db
+from models.transaction import Transaction
+from utils.asgi_bridge import WsgiBridge
+from utils.auth import parse_bearer, authenticate
+from utils.metrics import http_request_seconds
+from utils.pagination import encode_cursor, decode_cursor, parse_date, InvalidCursorError
+from routes.blockchain_routes import DEFAULT_HISTORY_PAGE, MAX_HISTORY_PAGE
+
+load_dotenv()
+
+ASYNC_WSGI_THREADS = int(os.getenv("ASYNC_WSGI_THREADS", 64))
+ALLOWED_ORIGINS = ("http://localhost:3000", "https://depayment.vercel.app")
+
+wsgi = WsgiBridge(flask_app, ASYNC_WSGI_THREADS)
+
+
+class AsyncRequest:
+    def __init__(self, scope):
+        self.scope = scope
+        self.headers = {name.decode("latin1"): value.decode("latin1") for name, value in scope["headers"]}
+        self.args = {k: v[0] for k, v in parse_qs(scope.get("query_string", b"").decode("latin1")).items()}
+        self.account_number = None
+        self.auth_ms = None
+
+
+async def _authenticate(request):
+    started = time.perf_counter()
+    # Cache hits are cheap, but a miss verifies an HMAC and may sync revocations
+    claims, error = await asyncio.get_running_loop().run_in_executor(
+        None, authenticate, parse_bearer(request.headers.get("authorization"))
+    )
+    request.auth_ms = round((time.perf_counter() - started) * 1000, 3)
+    if error:
+        return {"error": error}, 401
+    request.account_number = claims["account_number"]
+    return None
+
+
+async def verify_account(request):
+    account_number = request.args.get("accountNumber")
+    if not account_number:
+        return {"success": False, "error": "Account number is required"}, 400
+
+    # Names rarely change, so a lagging secondary is fine here
+    account = await get_async_db()["wallets"].with_options(read_preference=STALE_READS).find_one(
+        {"account_number": account_number}, {"first_name": 1, "last_name": 1, "full_name": 1}
+    )
+    if not account:
+        return {"exists": False, "error": "Account not found"}, 404
+    return {
+        "exists": True,
+        "accountNumber": account_number,
+        "first_name": account["first_name"],
+        "last_name": account["last_name"],
+        "full_name": account["full_name"]
+    }, 200
+
+
+async def account_details(request):
+    denied = await _authenticate(request)
+    if denied:
+        return denied
+
+    account = await get_async_db()["wallets"].find_one(
+        {"account_number": request.account_number},
+        {"first_name": 1, "last_name": 1, "full_name": 1, "email": 1, "balance": 1}
+    )
+    if not account:
+        return {"success": False, "error": "Account not found"}, 404
+    return {
+        "success": True,
+        "accountNumber": request.account_number,
+        "first_name": account["first_name"],
+        "last_name": account["last_name"],
+        "full_name": account["full_name"],
+        "email": account["email"],
+        "balance": account["balance"],
+    }, 200
+
+
+async def view_balance(request):
+    if "height" in request.args:
+        # Ledger replay is not on the async path
+        return None
+    denied = await _authenticate(request)
+    if denied:
+        return denied
+
+    wallet = await get_async_db()["wallets"].find_one({"account_number": request.account_number}, {"balance": 1})
+    if not wallet:
+        return {"error": "Wallet not found"}, 404
+    return {"balance": wallet.get("balance", 0)}, 200
+
+
+async def transaction_history(request):
+    denied = await _authenticate(request)
+    if denied:
+        return denied
+
+    try:
+        limit = min(int(request.args.get("limit", DEFAULT_HISTORY_PAGE)), MAX_HISTORY_PAGE)
+        start = parse_date(request.args.get("from"))
+        end = parse_date(request.args.get("to"))
+    except ValueError:
+        return {"error": "limit must be a number and from/to ISO dates"}, 400
+    if limit <= 0:
+        return {"error": "limit must be positive"}, 400
+
+    cursor = request.args.get("cursor")
+    try:
+        before = decode_cursor(cursor) if cursor else None
+    except InvalidCursorError:
+        return {"error": "Invalid cursor"}, 400
+
+    pipeline = Transaction._history_pipeline(request.account_number, start, end,
+                                             request.args.get("counterparty"), before, limit + 1)
+    rows = await get_async_db()["transactions"].with_options(read_preference=STALE_READS).aggregate(pipeline).to_list(None)
+    history, has_more = rows[:limit], len(rows) > limit
+
+    next_cursor = None
+    if has_more:
+        last = history[-1]
+        next_cursor = encode_cursor(last["timestamp"], last["_id"])
+    return {"history": history, "next_cursor": next_cursor}, 200
+
+
+ROUTES = {
+    "/api/accounts/verify": verify_account,
+    "/api/accounts/details": account_details,
+    "/api/blockchain/balance": view_balance,
+    "/api/blockchain/history": transaction_history,
+}
+
+
+def _headers(request, body):
+    headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+    origin = request.headers.get("origin")
+    if origin in ALLOWED_ORIGINS:
+        headers += [(b"access-control-allow-origin", origin.encode()),
+                    (b"access-control-allow-credentials", b"true"),
+                    (b"vary", b"Origin")]
+    if request.auth_ms is not None:
+        headers.append((b"server-timing", f"auth;dur={request.auth_ms}".encode()))
+    return headers
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            close_async_db()
+            wsgi.shutdown()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await _lifespan(receive, send)
+
+    handler = ROUTES.get(scope["path"]) if scope["type"] == "http" and scope["method"] == "GET" else None
+    if handler is not None:
+        started = time.perf_counter()
+        request = AsyncRequest(scope)
+        result = await handler(request)
+        if result is not None:
+            payload, status = result
+            http_request_seconds.observe(time.perf_counter() - started, "GET", scope["path"], str(status))
+            # Flask's JSON provider keeps datetimes and key order identical to the sync routes
+            body = flask_app.json.dumps(payload, separators=(",", ":")).encode()
+            await send({"type": "http.response.start", "status": status, "headers": _headers(request, body)})
+            await send({"type": "http.response.body", "body": body})
+            return
+
+    await wsgi(scope, receive, send)
@@ -0,0 +1,283 @@
+#benchmark.py
+"""Micro-benchmarks and a load test for the payment hot paths.
+
+Runs against mongomock by default (no server needed) or a local mongod
+with --backend mongod, in a throwaway database (--db-name) that is dropped
+afterwards. Results are printed as JSON; with --baseline the
+run is compared against an earlier result file and exits non-zero when a
+metric regresses by more than --tolerance.
+"""
+import argparse
+import json
+import os
+import platform
+import threading
+import time
+from datetime import datetime, timedelta
+# No database imports, so it is safe before the backend is chosen
+from utils.mining import MINERS
+
+BACKENDS = ("mongomock", "mongod")
+
+
+def _use_backend(backend, db_name):
+    # Must run before anything imports db.py
+    os.environ["MONGODB_DB"] = db_name
+    if backend == "mongomock":
+        import mongomock
+        import pymongo
+        pymongo.MongoClient = mongomock.MongoClient
+        # mongomock has no sessions
+        os.environ["USE_MONGO_TRANSACTIONS"] = "false"
+    os.environ.setdefault("JWT_SECRET", "benchmark-secret")
+    os.environ.setdefault("CHECK_QUERY_PLANS", "false")
+
+
+def _drop_database(db_name):
+    import sys
+    if "routes.blockchain_routes" in sys.modules:
+        # Stop mining first so no block lands after the drop
+        sys.modules["routes.blockchain_routes"].block_producer.stop(flush=False)
+    from db import client
+    client.drop_database(db_name)
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 3)
+
+
+def _latency(samples):
+    """Summary in ms of a list of durations in seconds."""
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    return {
+        "count": len(ordered),
+        "mean_ms": _ms(sum(ordered) / len(ordered)),
+        "p50_ms": _ms(pick(0.50)),
+        "p95_ms": _ms(pick(0.95)),
+        "p99_ms": _ms(pick(0.99)),
+        "max_ms": _ms(ordered[-1]),
+    }
+
+
+def _timed(fn, iterations):
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return _latency(samples)
+
+
+def bench_mining(difficulties, rounds, strategy):
+    from models.blockchain import Block
+    from models.transaction import Transaction
+
+    txs = [Transaction("100000000000", "100000000001", "A", "B", 1, None, None) for _ in range(8)]
+    results = {}
+    for difficulty in difficulties:
+        nonces = 0
+        elapsed = 0.0
+        for _ in range(rounds):
+            block = Block(txs, "0" * 64)
+            started = time.perf_counter()
+            block.mine_block(difficulty, strategy=strategy)
+            elapsed += time.perf_counter() - started
+            # Hashes needed by a serial search; parallel miners may try more
+            nonces += block.nonce + 1
+        results[f"difficulty_{difficulty}"] = {
+            "rounds": rounds,
+            "strategy": strategy or "default",
+            "mean_block_ms": _ms(elapsed / rounds),
+            "hashes_per_sec": round(nonces / elapsed, 1) if elapsed else 0.0,
+        }
+    return results
+
+
+def bench_crypto(iterations):
+    from utils.crypto_utils import generate_keys, serialize_private_key, decrypt_private_key, sign_message
+    from utils.hashed import hash_pin, verify_pin
+
+    private_key, _ = generate_keys()
+    encrypted_pem, salt = serialize_private_key(private_key, "Passw0rdA")
+    hashed = hash_pin("1234")
+    message = b"0" * 64
+    return {
+        "decrypt_private_key": _timed(lambda: decrypt_private_key(encrypted_pem, "Passw0rdA", salt), iterations),
+        "sign_message": _timed(lambda: sign_message(private_key, message), iterations),
+        "verify_pin": _timed(lambda: verify_pin("1234", hashed), iterations),
+    }
+
+
+def bench_history(sizes, iterations):
+    from db import transactions_collection
+    from models.transaction import Transaction
+
+    results = {}
+    for size in sizes:
+        account = f"9{size:011d}"
+        start = datetime.utcnow() - timedelta(seconds=size)
+        transactions_collection.insert_many([{
+            "txn_id": f"BENCH{size}-{i}",
+            "sender": {"account": account if i % 2 else "900000000000", "name": "A"},
+            "receiver": {"account": "900000000000" if i % 2 else account, "name": "B"},
+            "amount": 1,
+            "note": None,
+            "timestamp": start + timedelta(seconds=i),
+            "tx_hash": "0" * 64,
+            "status": "confirmed",
+        } for i in range(size)])
+        results[f"history_{size}"] = {
+            "find_by_account_number": _timed(lambda: Transaction.find_by_account_number(account), iterations),
+            "find_page_20": _timed(lambda: Transaction.find_page(account, 20), iterations),
+        }
+    return results
+
+
+def bench_transactions(clients, requests_per_client):
+    from app import app
+
+    def signup(client, email):
+        r = client.post("/api/auth/signup", json={"firstName": "Bench", "lastName": "User", "fullName": "Bench User",
+                                                  "email": email, "password": "Passw0rdA"})
+        token, account = r.json["token"], r.json["account_number"]
+        client.post("/api/auth/set-pin", json={"pin": "1234"}, headers={"Authorization": f"Bearer {token}"})
+        return token, account
+
+    setup = app.test_client()
+    run_id = int(time.time() * 1000)
+    senders = [signup(setup, f"bench-sender-{run_id}-{i}@example.com") for i in range(clients)]
+    _, receiver = signup(setup, f"bench-receiver-{run_id}@example.com")
+    for _, account in senders:
+        setup.post("/api/blockchain/credit", json={"account_number": account, "amount": requests_per_client * 10,
+                                                   "password": "Passw0rdA"})
+
+    samples = []
+    statuses = {}
+    lock = threading.Lock()
+
+    def worker(token):
+        client = app.test_client()
+        headers = {"Authorization": f"Bearer {token}"}
+        for _ in range(requests_per_client):
+            started = time.perf_counter()
+            r = client.post("/api/blockchain/transaction", headers=headers,
+                            json={"receiver_account": receiver, "amount": 1, "pin": "1234"})
+            elapsed = time.perf_counter() - started
+            with lock:
+                samples.append(elapsed)
+                statuses[r.status_code] = statuses.get(r.status_code, 0) + 1
+
+    threads = [threading.Thread(target=worker, args=(token,)) for token, _ in senders]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    return {
+        "clients": clients,
+        "requests": len(samples),
+        "statuses": {str(code): count for code, count in sorted(statuses.items())},
+        "requests_per_sec": round(len(samples) / elapsed, 1) if elapsed else 0.0,
+        "latency": _latency(samples),
+    }
+
+
+def _flatten(results, prefix=""):
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, name + "."))
+        elif isinstance(value, (int, float)):
+            flat[name] = value
+    return flat
+
+
+def compare(current, baseline, tolerance):
+    """Metrics that got worse than baseline by more than tolerance (a fraction)."""
+    regressions = []
+    old = _flatten(baseline)
+    for name, value in _flatten(current).items():
+        before = old.get(name)
+        if not before:
+            continue
+        if name.endswith("_per_sec"):
+            change = (before - value) / before
+        elif name.endswith("_ms") and ".max_ms" not in name:
+            change = (value - before) / before
+        else:
+            continue
+        if change > tolerance:
+            regressions.append({"metric": name, "baseline": before, "current": value,
+                                "change": round(change, 3)})
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark mining, crypto, history queries and /transaction.")
+    parser.add_argument("--backend", choices=BACKENDS, default="mongomock",
+                        help="mongomock (in process) or mongod (MONGODB_URI)")
+    parser.add_argument("--db-name", default=f"benchmark_{os.getpid()}_{int(time.time())}",
+                        help="database to create and drop (default: a fresh benchmark_* name)")
+    parser.add_argument("--keep-db", action="store_true", help="do not drop the database afterwards")
+    parser.add_argument("--only", nargs="+", choices=("mining", "crypto", "history", "transactions"),
+                        help="run a subset of the benchmarks")
+    parser.add_argument("--difficulties", type=int, nargs="+", default=[2, 3, 4])
+    parser.add_argument("--mining-rounds", type=int, default=3)
+    parser.add_argument("--mining-strategy", choices=tuple(MINERS), default=None)
+    parser.add_argument("--iterations", type=int, default=20, help="samples per latency benchmark")
+    parser.add_argument("--history-sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--clients", type=int, default=8, help="concurrent /transaction clients")
+    parser.add_argument("--requests", type=int, default=25, help="transfers per client")
+    parser.add_argument("--output", help="write the JSON report here as well as to stdout")
+    parser.add_argument("--baseline", help="earlier report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed regression, as a fraction")
+    args = parser.parse_args()
+
+    if args.db_name == "blockchain_bank":
+        parser.error("refusing to benchmark against the application database")
+    _use_backend(args.backend, args.db_name)
+    selected = set(args.only or ("mining", "crypto", "history", "transactions"))
+
+    results = {}
+    try:
+        if "mining" in selected:
+            results["mining"] = bench_mining(args.difficulties, args.mining_rounds, args.mining_strategy)
+        if "crypto" in selected:
+            results["crypto"] = bench_crypto(args.iterations)
+        if "history" in selected:
+            results["history"] = bench_history(args.history_sizes, args.iterations)
+        if "transactions" in selected:
+            results["transactions"] = bench_transactions(args.clients, args.requests)
+    finally:
+        if args.backend == "mongod" and not args.keep_db:
+            _drop_database(args.db_name)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "backend": args.backend,
+            "database": args.db_name,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "results": results,
+    }
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        report["regressions"] = compare(results, baseline.get("results", {}), args.tolerance)
+        exit_code = 1 if report["regressions"] else 0
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+    raise SystemExit(exit_code)
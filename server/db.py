@@ -1,13 +1,65 @@
 # db.py
 from pymongo import MongoClient
+from pymongo.read_preferences import Primary, SecondaryPreferred
+from pymongo.write_concern import WriteConcern
 import os
 from dotenv import load_dotenv
+from utils.pool_metrics import pool_metrics
+from utils.metrics import command_metrics
 
 load_dotenv()
 
 mongodb_uri = os.getenv("MONGODB_URI")
-client = MongoClient(mongodb_uri)
-db = client["blockchain_bank"]
-wallets_collection = db["wallets"]
-blocks_collection = db["blocks"]
-transactions_collection = db["transactions"]
\ No newline at end of file
+MONGODB_DB = os.getenv("MONGODB_DB", "blockchain_bank")
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", 100))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", 0))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", 60000))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", 5000))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", 5000))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", 30000))
+# Read-mostly queries may go to a secondary at most this far behind (MongoDB's floor is 90s)
+MONGO_READ_FROM_SECONDARIES = os.getenv("MONGO_READ_FROM_SECONDARIES", "true").lower() == "true"
+MONGO_MAX_STALENESS_SECONDS = max(90, int(os.getenv("MONGO_MAX_STALENESS_SECONDS", 90)))
+MONGO_MAJORITY_TIMEOUT_MS = int(os.getenv("MONGO_MAJORITY_TIMEOUT_MS", 10000))
+
+# Money movement must survive a failover; derived data can be rebuilt,
+# so it only needs the primary's acknowledgement
+MONEY_WRITES = WriteConcern(w="majority", j=True, wtimeout=MONGO_MAJORITY_TIMEOUT_MS)
+RELAXED_WRITES = WriteConcern(w=1)
+STALE_READS = SecondaryPreferred(max_staleness=MONGO_MAX_STALENESS_SECONDS) if MONGO_READ_FROM_SECONDARIES \
+    else Primary()
+
+client = MongoClient(
+    mongodb_uri,
+    maxPoolSize=MONGO_MAX_POOL_SIZE,
+    minPoolSize=MONGO_MIN_POOL_SIZE,
+    maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+    waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+    serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+    socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+    event_listeners=[pool_metrics, command_metrics]
+)
+db = client[MONGODB_DB]
+
+# Balances, transfers, their ledger entries, the chain, the dedup/revocation state, id shard leases
+# and node heartbeats
+wallets_collection = db.get_collection("wallets", write_concern=MONEY_WRITES)
+blocks_collection = db.get_collection("blocks", write_concern=MONEY_WRITES)
+transactions_collection = db.get_collection("transactions", write_concern=MONEY_WRITES)
+chain_state_collection = db.get_collection("chain_state", write_concern=MONEY_WRITES)
+ledger_collection = db.get_collection("ledger", write_concern=MONEY_WRITES)
+idempotency_collection = db.get_collection("idempotency_keys", write_concern=MONEY_WRITES)
+revoked_tokens_collection = db.get_collection("revoked_tokens", write_concern=MONEY_WRITES)
+id_shards_collection = db.get_collection("id_shards", write_concern=MONEY_WRITES)
+nodes_collection = db.get_collection("nodes", write_concern=MONEY_WRITES)
+
+# Rebuildable: ledger snapshots and the validator's progress marker
+balance_snapshots_collection = db.get_collection("balance_snapshots", write_concern=RELAXED_WRITES)
+validator_state_collection = db.get_collection("chain_state", write_concern=RELAXED_WRITES)
+
+# Read-mostly views for history, statements and validation. They may lag,
+# so never use them to decide whether money can move or to replay balances.
+transactions_read_collection = transactions_collection.with_options(read_preference=STALE_READS)
+blocks_read_collection = blocks_collection.with_options(read_preference=STALE_READS)
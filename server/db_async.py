@@ -0,0 +1,35 @@
+# db_async.py
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+mongodb_uri = os.getenv("MONGODB_URI")
+MONGODB_DB = os.getenv("MONGODB_DB", "blockchain_bank")
+ASYNC_MONGO_MAX_POOL_SIZE = int(os.getenv("ASYNC_MONGO_MAX_POOL_SIZE", 200))
+ASYNC_MONGO_MIN_POOL_SIZE = int(os.getenv("ASYNC_MONGO_MIN_POOL_SIZE", 10))
+ASYNC_MONGO_TIMEOUT_MS = int(os.getenv("ASYNC_MONGO_TIMEOUT_MS", 5000))
+
+_client = None
+
+
+def get_async_db():
+    """Motor database for the async serving mode, created on first use inside the event loop."""
+    global _client
+    if _client is None:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        _client = AsyncIOMotorClient(
+            mongodb_uri,
+            maxPoolSize=ASYNC_MONGO_MAX_POOL_SIZE,
+            minPoolSize=ASYNC_MONGO_MIN_POOL_SIZE,
+            serverSelectionTimeoutMS=ASYNC_MONGO_TIMEOUT_MS,
+            connectTimeoutMS=ASYNC_MONGO_TIMEOUT_MS
+        )
+    return _client[MONGODB_DB]
+
+
+def close_async_db():
+    global _client
+    if _client is not None:
+        _client.close()
+        _client = None
@@ -0,0 +1,138 @@
+# db_indexes.py
+import logging
+import os
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+from dotenv import load_dotenv
+from db import wallets_collection, transactions_collection, blocks_collection, ledger_collection, \
+    balance_snapshots_collection, idempotency_collection, revoked_tokens_collection
+from utils.idempotency import IDEMPOTENCY_TTL
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+ENSURE_INDEXES = os.getenv("ENSURE_INDEXES", "true").lower() == "true"
+CHECK_QUERY_PLANS = os.getenv("CHECK_QUERY_PLANS", "true").lower() == "true"
+
+# (collection, keys, options)
+INDEXES = [
+    (wallets_collection, [("account_number", ASCENDING)], {"unique": True, "name": "account_number_unique"}),
+    (wallets_collection, [("email", ASCENDING)], {"unique": True, "name": "email_unique"}),
+    (transactions_collection, [("txn_id", ASCENDING)], {"unique": True, "name": "txn_id_unique"}),
+    # _id is the history sort's tie-break; with it in the key each $or branch
+    # streams in order and the two are merged without an in-memory sort
+    (transactions_collection, [("sender.account", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)],
+     {"name": "sender_timestamp_id"}),
+    (transactions_collection, [("receiver.account", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)],
+     {"name": "receiver_timestamp_id"}),
+    # The mempool journal: only pending transactions, per owning node
+    (transactions_collection, [("node", ASCENDING), ("timestamp", ASCENDING)],
+     {"name": "pending_node_timestamp", "partialFilterExpression": {"status": "pending"}}),
+    (blocks_collection, [("hash", ASCENDING)], {"unique": True, "name": "hash_unique"}),
+    (ledger_collection, [("account_number", ASCENDING), ("height", ASCENDING)], {"name": "account_height"}),
+    (ledger_collection, [("txn_id", ASCENDING)], {"name": "txn_id"}),
+    # Snapshots roll forward over a height range across all accounts
+    (ledger_collection, [("height", ASCENDING)], {"name": "height"}),
+    (balance_snapshots_collection, [("account_number", ASCENDING), ("height", DESCENDING)],
+     {"unique": True, "name": "account_height_unique"}),
+    (balance_snapshots_collection, [("height", DESCENDING)], {"name": "height"}),
+    # Stored responses expire on their own
+    (idempotency_collection, [("created_at", ASCENDING)], {"expireAfterSeconds": IDEMPOTENCY_TTL, "name": "created_at_ttl"}),
+    # Revocations are dropped once the token would have expired anyway
+    (revoked_tokens_collection, [("expires_at", ASCENDING)], {"expireAfterSeconds": 0, "name": "expires_at_ttl"}),
+    (revoked_tokens_collection, [("revoked_at", ASCENDING)], {"name": "revoked_at"}),
+    # Blocks written before heights were stored are left out of the unique constraint
+    (blocks_collection, [("height", ASCENDING)], {
+        "unique": True,
+        "name": "height_unique",
+        "partialFilterExpression": {"height": {"$exists": True}}
+    }),
+]
+
+# Superseded by a wider index above: (collection, name)
+RETIRED_INDEXES = [
+    (transactions_collection, "sender_timestamp"),
+    (transactions_collection, "receiver_timestamp"),
+]
+
+# Hot queries that must never fall back to a collection scan, nor to an
+# in-memory sort when they have one: (name, collection, filter, sort)
+HOT_QUERIES = [
+    ("wallet by account_number", wallets_collection, {"account_number": "000000000000"}, None),
+    ("wallet by email", wallets_collection, {"email": "probe@example.com"}, None),
+    ("transaction by txn_id", transactions_collection, {"txn_id": "TXN00000000"}, None),
+    ("history by account", transactions_collection,
+     {"$or": [{"sender.account": "000000000000"}, {"receiver.account": "000000000000"}]},
+     [("timestamp", DESCENDING), ("_id", DESCENDING)]),
+    ("block by hash", blocks_collection, {"hash": "0" * 64}, None),
+    ("blocks by height", blocks_collection, {"height": {"$gt": 0}}, [("height", ASCENDING)]),
+]
+
+
+def ensure_indexes():
+    """Create the indexes above and drop retired ones; failures (e.g. existing duplicates) are reported, not raised."""
+    created, failed = [], []
+    for collection, keys, options in INDEXES:
+        try:
+            collection.create_index(keys, **options)
+            created.append(f"{collection.name}.{options['name']}")
+        except OperationFailure as e:
+            logger.warning("Could not create index %s.%s: %s", collection.name, options["name"], e)
+            failed.append(f"{collection.name}.{options['name']}")
+    for collection, name in RETIRED_INDEXES:
+        try:
+            if name in collection.index_information():
+                collection.drop_index(name)
+        except OperationFailure as e:
+            logger.warning("Could not drop index %s.%s: %s", collection.name, name, e)
+    return created, failed
+
+
+def _stages(plan):
+    yield plan.get("stage")
+    for child in [plan.get("inputStage")] + plan.get("inputStages", []):
+        if child:
+            yield from _stages(child)
+
+
+def check_query_plans():
+    """Explain each hot query and warn when its winning plan scans the whole collection."""
+    regressions = []
+    for name, collection, query, sort in HOT_QUERIES:
+        cursor = collection.find(query).limit(1)
+        if sort:
+            cursor = cursor.sort(sort)
+        try:
+            plan = cursor.explain()["queryPlanner"]["winningPlan"]
+        except (OperationFailure, KeyError) as e:
+            logger.warning("Could not explain '%s': %s", name, e)
+            continue
+        # Sharded clusters wrap each shard's plan
+        plans = [s["winningPlan"] for s in plan["shards"]] if "shards" in plan else [plan]
+        if any("COLLSCAN" in _stages(p) for p in plans):
+            logger.warning("Hot query '%s' on %s is doing a collection scan", name, collection.name)
+            regressions.append(name)
+        elif sort and any("SORT" in _stages(p) for p in plans):
+            logger.warning("Hot query '%s' on %s is sorting in memory", name, collection.name)
+            regressions.append(name)
+    return regressions
+
+
+def bootstrap():
+    if ENSURE_INDEXES:
+        ensure_indexes()
+    if CHECK_QUERY_PLANS:
+        # Diagnostics only; never block startup on them
+        try:
+            check_query_plans()
+        except Exception:
+            logger.exception("Query plan check failed")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+    created, failed = ensure_indexes()
+    logger.info("Indexes ensured: %d, failed: %d", len(created), len(failed))
+    regressions = check_query_plans()
+    raise SystemExit(1 if failed or regressions else 0)
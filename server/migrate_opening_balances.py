@@ -0,0 +1,10 @@
+#migrate_opening_balances.py
+import argparse
+from models.ledger import Ledger
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Write opening-balance ledger entries for wallets created before the ledger existed.")
+    parser.parse_args()
+
+    print(f"Opening balances recorded: {Ledger.record_opening_balances()}")
@@ -1,29 +1,113 @@
-from datetime import datetime
+from collections import deque, namedtuple
+from datetime import datetime, timedelta
+import calendar
 import hashlib
-from db import blocks_collection
+import logging
+import os
+import struct
+import threading
+import time
+import uuid
+from pymongo import ASCENDING
+from pymongo.errors import DuplicateKeyError, PyMongoError
+from db import blocks_collection, chain_state_collection
 from models.transaction import Transaction
+from models.ledger import Ledger
+from models.mempool import Mempool
+from utils.id_generator import NODE_ID
+from utils.node_heartbeat import node_heartbeat
+from utils.mining import get_miner, NONCE_STRUCT
+from utils.merkle import merkle_root, merkle_proof
+from utils.metrics import observe_mining, span
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+BLOCK_MAX_TRANSACTIONS = int(os.getenv("BLOCK_MAX_TRANSACTIONS", 500))
+BLOCK_INTERVAL_SECONDS = float(os.getenv("BLOCK_INTERVAL_SECONDS", 2))
+MINING_DIFFICULTY = int(os.getenv("MINING_DIFFICULTY", 4))
+CHAIN_INDEX_MAX_ENTRIES = int(os.getenv("CHAIN_INDEX_MAX_ENTRIES", 100000))
+MINE_MAX_ATTEMPTS = 5
+# How often the block producer looks for transactions left by dead nodes
+MEMPOOL_ADOPT_INTERVAL_SECONDS = float(os.getenv("MEMPOOL_ADOPT_INTERVAL_SECONDS", 30))
+
+HEADER_PROJECTION = {"_id": 0, "height": 1, "hash": 1, "previous_hash": 1, "merkle_root": 1, "timestamp": 1, "nonce": 1}
+
+BlockHeader = namedtuple("BlockHeader", ["height", "hash", "previous_hash", "merkle_root", "timestamp", "nonce"])
+
+# Binary block header: previous hash (32) | merkle root (32) | timestamp ms (8) | nonce (8)
+BLOCK_VERSION = 2
+HEADER_PREFIX_STRUCT = struct.Struct(">32s32sq")
+
+
+def timestamp_ms(dt):
+    # Naive datetimes are treated as UTC, which is how MongoDB stores them
+    return calendar.timegm(dt.utctimetuple()) * 1000 + dt.microsecond // 1000
+
+
+def encode_header_prefix(previous_hash, merkle_root, timestamp):
+    return HEADER_PREFIX_STRUCT.pack(bytes.fromhex(previous_hash.rjust(64, "0")), bytes.fromhex(merkle_root),
+                                     timestamp_ms(timestamp))
+
+
+def encode_header(previous_hash, merkle_root, timestamp, nonce):
+    return encode_header_prefix(previous_hash, merkle_root, timestamp) + NONCE_STRUCT.pack(nonce)
+
+
+def legacy_block_hash(tx_hashes, previous_hash, timestamp, nonce):
+    # Blocks without a version were hashed over this string instead of a binary header
+    block_string = f"{list(tx_hashes)}{previous_hash}{timestamp}{nonce}"
+    return hashlib.sha256(block_string.encode()).hexdigest()
+
 
 class Block:
-    def __init__(self, transactions, previous_hash):
+    __slots__ = ("transactions", "previous_hash", "height", "merkle_root", "timestamp", "nonce", "hash", "_prefix")
+
+    def __init__(self, transactions, previous_hash, height=0):
         self.transactions = transactions
         self.previous_hash = previous_hash
-        self.timestamp = datetime.now()
+        self.height = height
+        self.merkle_root = merkle_root([tx.tx_hash for tx in transactions])
+        # Millisecond precision so the header survives a round trip through MongoDB
+        now = datetime.now()
+        self.timestamp = now.replace(microsecond=now.microsecond // 1000 * 1000)
         self.nonce = 0
+        self._prefix = None
         self.hash = self.calculate_hash()
 
+    def header_prefix(self):
+        # Everything in the header except the nonce; fixed for the life of the block
+        if self._prefix is None:
+            self._prefix = encode_header_prefix(self.previous_hash, self.merkle_root, self.timestamp)
+        return self._prefix
+
+    def header_bytes(self):
+        return self.header_prefix() + NONCE_STRUCT.pack(self.nonce)
+
     def calculate_hash(self):
-        block_string = f"{[tx.tx_hash for tx in self.transactions]}{self.previous_hash}{self.timestamp}{self.nonce}"
-        return hashlib.sha256(block_string.encode()).hexdigest()
+        return hashlib.sha256(self.header_bytes()).hexdigest()
 
-    def mine_block(self, difficulty):
-        while not self.hash.startswith('0' * difficulty):
-            self.nonce += 1
-            self.hash = self.calculate_hash()
+    def mine_block(self, difficulty, strategy=None):
+        if self.hash.startswith('0' * difficulty):
+            return
+        start_nonce = self.nonce
+        started = time.perf_counter()
+        self.nonce, self.hash = get_miner(strategy).mine(self.header_prefix(), difficulty, self.nonce)
+        observe_mining(difficulty, self.nonce - start_nonce + 1, time.perf_counter() - started)
+
+    def header(self):
+        return BlockHeader(self.height, self.hash, self.previous_hash, self.merkle_root, self.timestamp, self.nonce)
 
     def save_to_db(self):
         blocks_collection.insert_one({
-            "transactions": [vars(tx) for tx in self.transactions],
+            "version": BLOCK_VERSION,
+            "height": self.height,
+            "header": self.header_bytes(),
+            "transactions": [tx.to_dict() for tx in self.transactions],
             "previous_hash": self.previous_hash,
+            "merkle_root": self.merkle_root,
             "timestamp": self.timestamp,
             "nonce": self.nonce,
             "hash": self.hash
@@ -31,9 +115,33 @@ class Block:
 
 class Blockchain:
     def __init__(self):
-        self.difficulty = 4
-        self.chain = [self.create_genesis_block()]
-        self.pending_transactions = []
+        self.difficulty = MINING_DIFFICULTY
+        self.mining_lock = threading.Lock()
+        # height <-> hash index, filled lazily from streamed headers
+        self.height_index = {}
+        self.hash_index = {}
+        self.tip = self.load_tip() or self.create_genesis_block()
+        self._index(self.tip)
+        # (block_hash, height, txn_ids) of saved blocks whose confirmation failed
+        self._unconfirmed = []
+        self._unconfirmed_lock = threading.Lock()
+        self.mempool = Mempool()
+        node_heartbeat.start()
+        self.recover_mempool()
+
+    def load_tip(self):
+        # The checkpoint makes startup O(1) regardless of chain length
+        checkpoint = chain_state_collection.find_one({"_id": "tip"})
+        if checkpoint:
+            return self._to_header(checkpoint)
+
+        # No checkpoint yet: fall back to the highest persisted block and write one
+        latest = blocks_collection.find_one({"height": {"$exists": True}}, HEADER_PROJECTION, sort=[("height", -1)])
+        if latest:
+            header = self._to_header(latest)
+            self._save_checkpoint(header, expected_hash=None)
+            return header
+        return None
 
     def create_genesis_block(self):
         genesis_tx = Transaction(
@@ -48,21 +156,417 @@ class Blockchain:
         block = Block([genesis_tx], "0")
         block.mine_block(self.difficulty)
         block.save_to_db()
-        return block
+        try:
+            self._save_checkpoint(block.header(), expected_hash=None)
+        except DuplicateKeyError:
+            # Another worker created the chain first; adopt theirs
+            blocks_collection.delete_one({"hash": block.hash})
+            return self.load_tip()
+        return block.header()
+
+    def _save_checkpoint(self, header, expected_hash):
+        doc = {"height": header.height, "hash": header.hash, "previous_hash": header.previous_hash,
+               "merkle_root": header.merkle_root, "timestamp": header.timestamp, "nonce": header.nonce}
+        if expected_hash is None:
+            chain_state_collection.insert_one({"_id": "tip", **doc})
+            return True
+        # Compare-and-set so two processes can never both extend the same tip
+        result = chain_state_collection.update_one({"_id": "tip", "hash": expected_hash}, {"$set": doc})
+        return result.matched_count == 1
+
+    @staticmethod
+    def _to_header(doc):
+        # Blocks written before the binary header have no merkle_root
+        return BlockHeader(doc["height"], doc["hash"], doc["previous_hash"], doc.get("merkle_root"),
+                           doc["timestamp"], doc["nonce"])
+
+    def _index(self, header):
+        if len(self.height_index) >= CHAIN_INDEX_MAX_ENTRIES:
+            self.height_index.clear()
+            self.hash_index.clear()
+        self.height_index[header.height] = header.hash
+        self.hash_index[header.hash] = header.height
 
     def get_latest_block(self):
-        return self.chain[-1]
+        return self.tip
+
+    def refresh_tip(self):
+        tip = self.load_tip()
+        if tip and tip.height >= self.tip.height:
+            self.tip = tip
+            self._index(tip)
+        return self.tip
+
+    def iter_headers(self, start_height=0, end_height=None):
+        """Stream block headers in height order without loading transactions."""
+        query = {"height": {"$gte": start_height}}
+        if end_height is not None:
+            query["height"]["$lte"] = end_height
+        for doc in blocks_collection.find(query, HEADER_PROJECTION).sort("height", ASCENDING):
+            header = self._to_header(doc)
+            self._index(header)
+            yield header
+
+    def get_header(self, height=None, block_hash=None):
+        if height is not None:
+            block_hash = self.height_index.get(height, block_hash)
+            query = {"hash": block_hash} if block_hash else {"height": height}
+        else:
+            query = {"hash": block_hash}
+        doc = blocks_collection.find_one(query, HEADER_PROJECTION)
+        if not doc or "height" not in doc:
+            return None
+        header = self._to_header(doc)
+        self._index(header)
+        return header
+
+    def height_of(self, block_hash):
+        if block_hash in self.hash_index:
+            return self.hash_index[block_hash]
+        header = self.get_header(block_hash=block_hash)
+        return header.height if header else None
+
+    def inclusion_proof(self, block_hash, tx_hash):
+        """Merkle path proving tx_hash is committed to by the block's header, or None."""
+        block = blocks_collection.find_one({"hash": block_hash},
+                                           {"_id": 0, "height": 1, "merkle_root": 1, "transactions.tx_hash": 1})
+        if not block or "merkle_root" not in block:
+            return None
+        tx_hashes = [tx["tx_hash"] for tx in block["transactions"]]
+        if tx_hash not in tx_hashes:
+            return None
+        index = tx_hashes.index(tx_hash)
+        return {
+            "block_hash": block_hash,
+            "height": block.get("height"),
+            "merkle_root": block["merkle_root"],
+            "index": index,
+            "proof": merkle_proof(tx_hashes, index)
+        }
+
+    def recover_mempool(self):
+        """Adopt the pending transactions of nodes whose heartbeat lapsed; returns how many were queued."""
+        owners = Transaction.pending_owners() - {NODE_ID}
+        dead = owners - node_heartbeat.live_nodes(owner for owner in owners if owner)
+        txs = [tx for owner in dead for tx in Transaction.adopt_pending(owner, NODE_ID)]
+        if not txs:
+            return 0
+        # A crash between saving a block and confirming its transactions
+        # leaves them pending; finish confirming instead of mining them twice
+        mined = self._find_mined({tx.txn_id for tx in txs}, min(tx.timestamp for tx in txs))
+        for (block_hash, height), txn_ids in mined.items():
+            self._confirm(block_hash, height, txn_ids)
+        done = {txn_id for txn_ids in mined.values() for txn_id in txn_ids}
+        queued = 0
+        for tx in sorted(txs, key=lambda tx: tx.timestamp):
+            if tx.txn_id not in done:
+                self.mempool.add(tx)
+                queued += 1
+        return queued
+
+    def _find_mined(self, txn_ids, since):
+        # Walk back from the tip; a day of slack covers local-vs-UTC block timestamps
+        since = since.replace(tzinfo=None) - timedelta(days=1)
+        mined = {}
+        cursor = blocks_collection.find({"height": {"$exists": True}},
+                                        {"_id": 0, "hash": 1, "height": 1, "timestamp": 1, "transactions.txn_id": 1})
+        for block in cursor.sort("height", -1):
+            if block["timestamp"] < since:
+                break
+            found = [tx["txn_id"] for tx in block["transactions"] if tx["txn_id"] in txn_ids]
+            if found:
+                mined[(block["hash"], block["height"])] = found
+        return mined
 
     def add_transaction(self, tx):
-        self.pending_transactions.append(tx)
+        return self.mempool.add(tx)
 
-    def mine_pending_transactions(self, miner_account):
-        if not self.pending_transactions:
-            return "No transactions to mine."
+    def pending_count(self):
+        return len(self.mempool)
 
-        block = Block(self.pending_transactions, self.get_latest_block().hash)
-        block.mine_block(self.difficulty)
-        block.save_to_db()
+    def mine_pending_transactions(self, miner_account, max_transactions=None):
+        # mining_lock keeps previous_hash links consistent when several callers mine
+        with self.mining_lock:
+            batch = self.mempool.select(max_transactions)
+            if not batch:
+                return "No transactions to mine."
+            claim_id, claimed, lost = self._claim(batch)
+            # Adopted by another node or already mined: not ours to mine
+            self.mempool.confirm(lost)
+            if not claimed:
+                return "No transactions to mine."
+
+            try:
+                block = self._mine(claimed)
+            except Exception:
+                Transaction.release_claim([tx.txn_id for tx in claimed], claim_id)
+                self.mempool.requeue(claimed)
+                raise
+            self.mempool.confirm(claimed)
+            return block
+
+    def mine_transactions(self, transactions):
+        """Mine exactly these transactions into one block, bypassing the mempool."""
+        with self.mining_lock:
+            claim_id, claimed, _ = self._claim(transactions)
+            if not claimed:
+                return None
+            try:
+                return self._mine(claimed)
+            except Exception:
+                Transaction.release_claim([tx.txn_id for tx in claimed], claim_id)
+                raise
+
+    @staticmethod
+    def _claim(batch):
+        """Reserve batch in the journal before mining it.
+
+        Only transactions still pending, owned by this node and unclaimed are
+        reserved, so two chains never put the same transaction in a block.
+        Returns (claim_id, claimed, lost).
+        """
+        claim_id = uuid.uuid4().hex
+        reserved = Transaction.claim([tx.txn_id for tx in batch], NODE_ID, claim_id)
+        claimed = [tx for tx in batch if tx.txn_id in reserved]
+        lost = [tx for tx in batch if tx.txn_id not in reserved]
+        if lost:
+            logger.warning("Dropped %d transactions claimed elsewhere or already mined", len(lost))
+        return claim_id, claimed, lost
+
+    def _mine(self, batch):
+        for _ in range(MINE_MAX_ATTEMPTS):
+            # Other workers may have extended the chain since we last looked
+            tip = self._reconcile_tip()
+            block = Block(batch, tip.hash, tip.height + 1)
+            block.mine_block(self.difficulty)
+            with span("block.persist"):
+                try:
+                    block.save_to_db()
+                except DuplicateKeyError:
+                    continue  # another worker saved a block at this height first
+                if self._link(block, tip):
+                    break
+        else:
+            raise RuntimeError("Chain tip kept moving, giving up on this batch")
+
+        self.tip = block.header()
+        self._index(self.tip)
+        self._confirm(block.hash, block.height, [tx.txn_id for tx in batch])
+        return block
+
+    def _link(self, block, tip):
+        """Move the checkpoint from tip to block, which is already saved at tip.height + 1.
+
+        Heights are unique, so once the block is saved the checkpoint can only
+        get past tip through it: a failed or ambiguous compare-and-set is
+        settled by re-reading the checkpoint, never by deleting the block.
+        """
+        for _ in range(MINE_MAX_ATTEMPTS):
+            try:
+                if self._save_checkpoint(block.header(), expected_hash=tip.hash):
+                    return True
+            except PyMongoError:
+                logger.warning("Checkpoint write for block %s failed; re-reading it", block.hash, exc_info=True)
+            try:
+                checkpoint = self.load_tip()
+            except PyMongoError:
+                continue
+            if checkpoint.height >= block.height:
+                # Another worker's _reconcile_tip adopted the block first
+                return True
+            if checkpoint.hash != tip.hash:
+                # Only a hand-edited checkpoint gets here; the block no longer
+                # extends it and _reconcile_tip will remove it
+                raise RuntimeError(f"Checkpoint moved to {checkpoint.hash} under block {block.hash}")
+        # The block still extends the checkpoint, so whoever mines next adopts
+        # it; its transactions must not be released to be mined again
+        logger.error("Could not move the checkpoint to block %s; leaving it for _reconcile_tip", block.hash)
+        return True
+
+    def _reconcile_tip(self):
+        """Bring the checkpoint up to the highest saved block that extends it.
+
+        A worker that stops between saving a block and moving the checkpoint
+        leaves the block at checkpoint height + 1, where it would block every
+        later block. Blocks that extend the checkpoint are adopted (and their
+        transactions confirmed); ones that don't can never be linked and are
+        removed.
+        """
+        tip = self.load_tip()
+        while True:
+            doc = blocks_collection.find_one({"height": tip.height + 1},
+                                             {**HEADER_PROJECTION, "transactions.txn_id": 1})
+            if doc is None:
+                break
+            if doc["previous_hash"] != tip.hash:
+                logger.warning("Removing block %s at height %s, which does not extend the chain",
+                               doc["hash"], doc["height"])
+                blocks_collection.delete_one({"hash": doc["hash"], "height": doc["height"]})
+                continue
+            header = self._to_header(doc)
+            if self._save_checkpoint(header, expected_hash=tip.hash):
+                logger.warning("Adopted block %s at height %s left without a checkpoint", header.hash, header.height)
+                self._confirm(header.hash, header.height, [tx["txn_id"] for tx in doc["transactions"]])
+            tip = self.load_tip()
+        self.tip = tip
+        self._index(tip)
+        return tip
+
+    def _confirm(self, block_hash, height, txn_ids):
+        """Record the block's height on its ledger entries and confirm its transactions.
+
+        The block is on the chain already, so a failure here must not requeue
+        its transactions: it is kept for retry_confirmations() instead. The
+        ledger goes first so that while the journal still says pending, a
+        node adopting the transactions finds them mined and confirms both.
+        Snapshots wait for a confirmed block, since they only count entries
+        that have a height.
+        """
+        try:
+            with span("block.confirm"):
+                Ledger.mark_confirmed(txn_ids, height)
+                Transaction.mark_confirmed(txn_ids, block_hash)
+        except Exception:
+            logger.exception("Block %s is saved but confirming its transactions failed; will retry", block_hash)
+            with self._unconfirmed_lock:
+                self._unconfirmed.append((block_hash, height, txn_ids))
+            return False
+        Ledger.maybe_snapshot(height)
+        return True
+
+    def retry_confirmations(self):
+        """Re-run confirmations that failed after their block was saved; returns how many still fail."""
+        with self._unconfirmed_lock:
+            pending, self._unconfirmed = self._unconfirmed, []
+        for block_hash, height, txn_ids in pending:
+            self._confirm(block_hash, height, txn_ids)
+        with self._unconfirmed_lock:
+            return len(self._unconfirmed)
+
+
+class BlockProducer:
+    """Background thread that batches pending transactions into mined blocks."""
+
+    def __init__(self, blockchain, max_transactions=BLOCK_MAX_TRANSACTIONS, interval=BLOCK_INTERVAL_SECONDS,
+                 adopt_interval=MEMPOOL_ADOPT_INTERVAL_SECONDS):
+        self.blockchain = blockchain
+        self.max_transactions = max_transactions
+        self.interval = interval
+        self.adopt_interval = adopt_interval
+        self._last_adopt = time.monotonic()
+        self._wakeup = threading.Condition()
+        self._first_pending_at = None
+        # Groups that must land in a block of their own, e.g. batch payments
+        self._dedicated = deque()
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        with self._wakeup:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name="block-producer", daemon=True)
+        self._thread.start()
+
+    def stop(self, flush=True):
+        with self._wakeup:
+            self._running = False
+            self._wakeup.notify()
+        if self._thread:
+            self._thread.join()
+        if flush:
+            self.flush()
+
+    def submit(self, tx):
+        pending = self.blockchain.add_transaction(tx)
+        with self._wakeup:
+            if self._first_pending_at is None:
+                self._first_pending_at = time.monotonic()
+            if pending >= self.max_transactions:
+                self._wakeup.notify()
+
+    def submit_block(self, txs):
+        """Queue txs to be mined together as one block.
+
+        They count against the mempool's limits until mined, so callers
+        should check_admission() for them before moving any money.
+        """
+        txs = list(txs)
+        if len(txs) > self.max_transactions:
+            raise ValueError(f"A block holds at most {self.max_transactions} transactions")
+        self.blockchain.mempool.reserve(txs)
+        with self._wakeup:
+            self._dedicated.append(txs)
+            self._wakeup.notify()
+
+    def flush(self):
+        while self._dedicated:
+            self._produce()
+        while self.blockchain.pending_count():
+            self._produce()
+
+    def _produce(self):
+        with self._wakeup:
+            group = self._dedicated.popleft() if self._dedicated else None
+        if group is not None:
+            try:
+                block = self.blockchain.mine_transactions(group)
+            except Exception:
+                with self._wakeup:
+                    self._dedicated.appendleft(group)
+                raise
+            self.blockchain.mempool.confirm(group)
+            return block
+
+        with self._wakeup:
+            self._first_pending_at = None
+        try:
+            return self.blockchain.mine_pending_transactions("system", self.max_transactions)
+        finally:
+            # Leftovers (or a failed batch) start a fresh batch window
+            if self.blockchain.pending_count():
+                with self._wakeup:
+                    if self._first_pending_at is None:
+                        self._first_pending_at = time.monotonic()
+
+    def _ready(self):
+        if self._dedicated or self.blockchain.pending_count() >= self.max_transactions:
+            return True
+        return self._first_pending_at is not None and time.monotonic() - self._first_pending_at >= self.interval
+
+    def _adopt(self):
+        if time.monotonic() - self._last_adopt < self.adopt_interval:
+            return
+        self._last_adopt = time.monotonic()
+        try:
+            adopted = self.blockchain.recover_mempool()
+        except Exception:
+            logger.exception("Adopting pending transactions failed")
+            return
+        if adopted:
+            with self._wakeup:
+                if self._first_pending_at is None:
+                    self._first_pending_at = time.monotonic()
 
-        self.chain.append(block)
-        self.pending_transactions = []
+    def _run(self):
+        while True:
+            self.blockchain.retry_confirmations()
+            self._adopt()
+            with self._wakeup:
+                if self._running and not self._ready():
+                    if self._first_pending_at is None:
+                        timeout = self.interval
+                    else:
+                        timeout = max(0.0, self.interval - (time.monotonic() - self._first_pending_at))
+                    self._wakeup.wait(timeout)
+                if not self._running:
+                    return
+                ready = self._ready()
+            if not ready:
+                continue
+            try:
+                self._produce()
+            except Exception:
+                logger.exception("Block production failed")
+                time.sleep(self.interval)
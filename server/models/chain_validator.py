@@ -0,0 +1,139 @@
+#models/chain_validator.py
+import hashlib
+import time
+from datetime import timedelta
+from db import blocks_read_collection, validator_state_collection
+from models.blockchain import MINING_DIFFICULTY, encode_header, legacy_block_hash
+from models.signature_verifier import signature_verifier
+from utils.merkle import merkle_root
+
+SIGNATURE_BATCH_SIZE = 256
+MAX_REPORTED_ERRORS = 100
+
+
+class ChainValidator:
+    def __init__(self, difficulty=MINING_DIFFICULTY, verifier=signature_verifier, batch_size=SIGNATURE_BATCH_SIZE):
+        self.difficulty = difficulty
+        self.verifier = verifier
+        self.batch_size = batch_size
+
+    def load_checkpoint(self):
+        return validator_state_collection.find_one({"_id": "validator"})
+
+    def save_checkpoint(self, height, block_hash):
+        validator_state_collection.update_one(
+            {"_id": "validator"},
+            {"$set": {"height": height, "hash": block_hash, "validated_at": time.time()}},
+            upsert=True
+        )
+
+    def _check_block(self, block, previous, errors):
+        height = block["height"]
+        if previous is not None:
+            if height != previous["height"] + 1:
+                errors.append({"height": height, "error": f"height gap after {previous['height']}"})
+            if block["previous_hash"] != previous["hash"]:
+                errors.append({"height": height, "error": "previous_hash does not link to prior block"})
+
+        if not block["hash"].startswith("0" * self.difficulty):
+            errors.append({"height": height, "error": "hash does not meet difficulty"})
+
+        if "merkle_root" in block:
+            tx_hashes = [tx["tx_hash"] for tx in block["transactions"]]
+            if merkle_root(tx_hashes) != block["merkle_root"]:
+                errors.append({"height": height, "error": "merkle_root does not match transactions"})
+            header = encode_header(block["previous_hash"], block["merkle_root"], block["timestamp"], block["nonce"])
+            if hashlib.sha256(header).hexdigest() != block["hash"]:
+                errors.append({"height": height, "error": "hash does not match header"})
+        elif not self._legacy_hash_matches(block):
+            errors.append({"height": height, "error": "hash does not match legacy block contents"})
+
+    @staticmethod
+    def _legacy_hash_matches(block):
+        # These blocks hashed a microsecond timestamp that MongoDB stored to the
+        # millisecond, so try each of the 1000 values it could have had
+        tx_hashes = [tx["tx_hash"] for tx in block["transactions"]]
+        stored = block["timestamp"]
+        return any(
+            legacy_block_hash(tx_hashes, block["previous_hash"], stored + timedelta(microseconds=us), block["nonce"])
+            == block["hash"]
+            for us in range(1000)
+        )
+
+    def _verify_batch(self, jobs, errors):
+        failed = []
+        results = self.verifier.verify_transactions([tx for _, tx in jobs])
+        for (height, tx), ok in zip(jobs, results):
+            if not ok:
+                errors.append({"height": height, "txn_id": tx["txn_id"], "error": "signature does not verify"})
+                failed.append(height)
+        return min(failed) if failed else None
+
+    def run(self, full=False):
+        started = time.perf_counter()
+        checkpoint = None if full else self.load_checkpoint()
+        previous = None
+        query = {"height": {"$exists": True}}
+        if checkpoint:
+            previous = {"height": checkpoint["height"], "hash": checkpoint["hash"]}
+            query = {"height": {"$gt": checkpoint["height"]}}
+
+        errors = []
+        blocks = 0
+        signatures = 0
+        first_bad_height = None
+        jobs = []
+
+        def flush():
+            nonlocal first_bad_height
+            bad = self._verify_batch(jobs, errors)
+            if bad is not None and (first_bad_height is None or bad < first_bad_height):
+                first_bad_height = bad
+            jobs.clear()
+
+        cursor = blocks_read_collection.find(query, {"_id": 0, "header": 0}).sort("height", 1)
+        for block in cursor:
+            before = len(errors)
+            self._check_block(block, previous, errors)
+            if len(errors) > before and first_bad_height is None:
+                first_bad_height = block["height"]
+
+            for tx in block["transactions"]:
+                if not tx.get("signature"):
+                    continue
+                jobs.append((block["height"], tx))
+                signatures += 1
+                if len(jobs) >= self.batch_size:
+                    flush()
+
+            previous = block
+            blocks += 1
+
+        if jobs:
+            flush()
+
+        # Only advance the checkpoint over the prefix that fully validated
+        checkpoint_height = checkpoint["height"] if checkpoint else None
+        good_height = previous["height"] if previous else None
+        if first_bad_height is not None:
+            good_height = first_bad_height - 1
+        if good_height is not None and good_height > (checkpoint_height if checkpoint_height is not None else -1):
+            good = blocks_read_collection.find_one({"height": good_height}, {"_id": 0, "hash": 1})
+            if good:
+                self.save_checkpoint(good_height, good["hash"])
+                checkpoint_height = good_height
+
+        elapsed = time.perf_counter() - started
+        errors.sort(key=lambda e: e["height"])
+        return {
+            "valid": not errors,
+            "from_height": checkpoint["height"] + 1 if checkpoint else 0,
+            "blocks": blocks,
+            "signatures": signatures,
+            "checkpoint_height": checkpoint_height,
+            "elapsed_seconds": elapsed,
+            "blocks_per_sec": blocks / elapsed if elapsed else 0.0,
+            "sigs_per_sec": signatures / elapsed if elapsed else 0.0,
+            "errors": errors[:MAX_REPORTED_ERRORS],
+            "error_count": len(errors),
+        }
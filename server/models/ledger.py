@@ -0,0 +1,233 @@
+#models/ledger.py
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pymongo import UpdateOne
+from dotenv import load_dotenv
+from db import ledger_collection, balance_snapshots_collection, wallets_collection
+
+load_dotenv()
+
+LEDGER_SNAPSHOT_INTERVAL = int(os.getenv("LEDGER_SNAPSHOT_INTERVAL", 100))
+RECONCILE_WORKERS = int(os.getenv("RECONCILE_WORKERS", 8))
+RECONCILE_CHUNK_SIZE = 1000
+SYSTEM_ACCOUNT = "system"
+OPENING_TXN_PREFIX = "OPENING-"
+
+
+class Ledger:
+    """Append-only per-account balance entries with height-keyed snapshots.
+
+    Entries are written with the transfer and carry height None until their
+    transaction is mined. A snapshot at height H holds each account's
+    balance over all entries with height <= H. Heights can be set after
+    later blocks' (a retried confirmation), so setting one at or below a
+    snapshot's height drops that snapshot.
+    """
+
+    @staticmethod
+    def _entries(tx, amount, now):
+        if tx.sender["account"] != SYSTEM_ACCOUNT:
+            yield {"account_number": tx.sender["account"], "txn_id": tx.txn_id,
+                   "delta": -amount, "height": None, "created_at": now}
+        if tx.receiver["account"] != SYSTEM_ACCOUNT:
+            yield {"account_number": tx.receiver["account"], "txn_id": tx.txn_id,
+                   "delta": amount, "height": None, "created_at": now}
+
+    @staticmethod
+    def record(tx, amount, session=None):
+        Ledger.record_many([(tx, amount)], session=session)
+
+    @staticmethod
+    def record_many(tx_amounts, session=None):
+        now = datetime.now(timezone.utc)
+        entries = [entry for tx, amount in tx_amounts for entry in Ledger._entries(tx, amount, now)]
+        if entries:
+            ledger_collection.insert_many(entries, session=session)
+
+    @staticmethod
+    def discard(txn_ids):
+        """Delete the unmined entries of transfers that were rolled back."""
+        if txn_ids:
+            ledger_collection.delete_many({"txn_id": {"$in": txn_ids}, "height": None})
+
+    @staticmethod
+    def mark_confirmed(txn_ids, height):
+        if not txn_ids:
+            return
+        result = ledger_collection.update_many({"txn_id": {"$in": txn_ids}}, {"$set": {"height": height}})
+        if result.modified_count:
+            # Normally nothing is this high yet; otherwise those snapshots miss these entries
+            balance_snapshots_collection.delete_many({"height": {"$gte": height}})
+
+    @staticmethod
+    def _sum_entries(match, collection=ledger_collection):
+        pipeline = [
+            {"$match": match},
+            {"$group": {"_id": "$account_number", "balance": {"$sum": "$delta"}}}
+        ]
+        return {row["_id"]: row["balance"] for row in collection.aggregate(pipeline)}
+
+    @staticmethod
+    def nearest_snapshot(account_number, height):
+        return balance_snapshots_collection.find_one(
+            {"account_number": account_number, "height": {"$lte": height}},
+            sort=[("height", -1)]
+        )
+
+    @staticmethod
+    def balance_at(account_number, height=None):
+        """Balance after block `height`, or including pending entries when height is None."""
+        if height is None:
+            return Ledger._sum_entries({"account_number": account_number}).get(account_number, 0)
+
+        snapshot = Ledger.nearest_snapshot(account_number, height)
+        base, after = (snapshot["balance"], snapshot["height"]) if snapshot else (0, -1)
+        # Replay only the entries mined after the snapshot. This reads the primary:
+        # mark_confirmed sets heights after the fact, so a lagging secondary would miss recent blocks
+        replay = Ledger._sum_entries({"account_number": account_number, "height": {"$gt": after, "$lte": height}})
+        return base + replay.get(account_number, 0)
+
+    @staticmethod
+    def take_snapshot(height):
+        """Roll the previous snapshot forward to `height` for every account with entries.
+
+        Returns the number of balances written, or 0 if a confirmation at or
+        below `height` landed while it ran and the snapshot was dropped.
+        """
+        previous = balance_snapshots_collection.find_one({"height": {"$lt": height}}, sort=[("height", -1)])
+        previous_height = previous["height"] if previous else -1
+
+        balances = {}
+        if previous:
+            for snap in balance_snapshots_collection.find({"height": previous_height},
+                                                          {"_id": 0, "account_number": 1, "balance": 1}):
+                balances[snap["account_number"]] = snap["balance"]
+        match = {"height": {"$gt": previous_height, "$lte": height}}
+        pipeline = [
+            {"$match": match},
+            {"$group": {"_id": "$account_number", "balance": {"$sum": "$delta"}, "entries": {"$sum": 1}}}
+        ]
+        counted = 0
+        for row in ledger_collection.aggregate(pipeline):
+            balances[row["_id"]] = balances.get(row["_id"], 0) + row["balance"]
+            counted += row["entries"]
+
+        taken_at = datetime.now(timezone.utc)
+        ops = [
+            UpdateOne({"account_number": account_number, "height": height},
+                      {"$set": {"balance": balance, "taken_at": taken_at}}, upsert=True)
+            for account_number, balance in balances.items()
+        ]
+        if ops:
+            balance_snapshots_collection.bulk_write(ops, ordered=False)
+
+        # mark_confirmed drops snapshots once they are written; a height set
+        # before that but after the sum shows up as an extra entry here, and
+        # one below previous_height as the base snapshot being gone
+        if (ledger_collection.count_documents(match) != counted
+                or previous and not balance_snapshots_collection.find_one({"height": previous_height}, {"_id": 1})):
+            balance_snapshots_collection.delete_many({"height": height})
+            return 0
+        return len(ops)
+
+    @staticmethod
+    def maybe_snapshot(height):
+        # Runs off the mining thread; snapshots are an optimisation, not a requirement
+        if LEDGER_SNAPSHOT_INTERVAL > 0 and height > 0 and height % LEDGER_SNAPSHOT_INTERVAL == 0:
+            threading.Thread(target=Ledger.take_snapshot, args=(height,), name="ledger-snapshot", daemon=True).start()
+
+    @staticmethod
+    def record_opening_balances(chunk_size=RECONCILE_CHUNK_SIZE):
+        """One-off migration for wallets that predate the ledger.
+
+        Each gets an opening entry at height 0 for whatever its stored balance
+        holds that its entries don't. Wallets that already have one are
+        skipped, so rerunning is safe. Run it with no transfers in flight.
+        Existing snapshots were taken without the openings, so they are
+        dropped and rebuilt on demand. Returns the number of entries written.
+        """
+        now = datetime.now(timezone.utc)
+        written = 0
+
+        def record(wallets):
+            numbers = [w["account_number"] for w in wallets]
+            derived = Ledger._sum_entries({"account_number": {"$in": numbers}})
+            opened = set(ledger_collection.distinct(
+                "account_number", {"txn_id": {"$in": [OPENING_TXN_PREFIX + n for n in numbers]}}))
+            entries = [{"account_number": w["account_number"], "txn_id": OPENING_TXN_PREFIX + w["account_number"],
+                        "delta": w.get("balance", 0) - derived.get(w["account_number"], 0), "height": 0,
+                        "created_at": now}
+                       for w in wallets if w["account_number"] not in opened]
+            entries = [entry for entry in entries if entry["delta"]]
+            if entries:
+                ledger_collection.insert_many(entries)
+            return len(entries)
+
+        chunk = []
+        for wallet in wallets_collection.find({}, {"_id": 0, "account_number": 1, "balance": 1}).batch_size(chunk_size):
+            chunk.append(wallet)
+            if len(chunk) >= chunk_size:
+                written += record(chunk)
+                chunk = []
+        if chunk:
+            written += record(chunk)
+
+        if written:
+            balance_snapshots_collection.delete_many({})
+        return written
+
+    @staticmethod
+    def _mismatches(wallets):
+        derived = Ledger._sum_entries({"account_number": {"$in": [w["account_number"] for w in wallets]}})
+        mismatches = []
+        for wallet in wallets:
+            stored = wallet.get("balance", 0)
+            ledger_balance = derived.get(wallet["account_number"], 0)
+            if stored != ledger_balance:
+                mismatches.append({"account_number": wallet["account_number"], "stored": stored,
+                                   "ledger": ledger_balance, "difference": stored - ledger_balance})
+        return mismatches
+
+    @staticmethod
+    def _reconcile_chunk(wallets):
+        # Both sides come from the primary. A transfer landing between the two
+        # reads still looks like a mismatch, so suspects are read again once.
+        mismatches = Ledger._mismatches(wallets)
+        if mismatches:
+            suspects = list(wallets_collection.find(
+                {"account_number": {"$in": [m["account_number"] for m in mismatches]}},
+                {"_id": 0, "account_number": 1, "balance": 1}))
+            mismatches = Ledger._mismatches(suspects)
+        return len(wallets), mismatches
+
+    @staticmethod
+    def reconcile(workers=RECONCILE_WORKERS, chunk_size=RECONCILE_CHUNK_SIZE):
+        """Compare ledger-derived and stored balances for every wallet, chunked across threads."""
+        started = datetime.now(timezone.utc)
+        cursor = wallets_collection.find({}, {"_id": 0, "account_number": 1, "balance": 1}).batch_size(chunk_size)
+
+        def chunks():
+            chunk = []
+            for wallet in cursor:
+                chunk.append(wallet)
+                if len(chunk) >= chunk_size:
+                    yield chunk
+                    chunk = []
+            if chunk:
+                yield chunk
+
+        checked = 0
+        mismatches = []
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            for count, chunk_mismatches in pool.map(Ledger._reconcile_chunk, chunks()):
+                checked += count
+                mismatches.extend(chunk_mismatches)
+
+        return {
+            "checked": checked,
+            "mismatched": len(mismatches),
+            "mismatches": mismatches,
+            "elapsed_seconds": (datetime.now(timezone.utc) - started).total_seconds(),
+        }
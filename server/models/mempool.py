@@ -0,0 +1,207 @@
+#models/mempool.py
+import heapq
+import itertools
+import os
+import threading
+from collections import Counter, deque
+from dotenv import load_dotenv
+from utils.metrics import registry, Gauge
+
+load_dotenv()
+
+SYSTEM_ACCOUNT = "system"
+MEMPOOL_MAX_SIZE = int(os.getenv("MEMPOOL_MAX_SIZE", 100000))
+MEMPOOL_MAX_PER_ACCOUNT = int(os.getenv("MEMPOOL_MAX_PER_ACCOUNT", 1000))
+
+mempool_size = registry.register(Gauge("mempool_transactions", "Transactions waiting to be mined"))
+
+
+class MempoolFullError(Exception):
+    """The pool as a whole is at capacity."""
+
+
+class AccountQueueFullError(MempoolFullError):
+    """One sender has too many transactions waiting."""
+
+
+class _Entry:
+    __slots__ = ("seq", "tx")
+
+    def __init__(self, seq, tx):
+        self.seq = seq
+        self.tx = tx
+
+
+class Mempool:
+    """Pending transactions, indexed by txn_id and by sender.
+
+    Each sender's transactions leave the pool in the order they arrived
+    (the arrival sequence plays the role of an account nonce), so only the
+    head of each sender's queue competes for the next block. Those heads
+    sit in a heap keyed by arrival, which makes taking k transactions
+    O(k log n) while no sender's backlog can hold up the others' heads.
+    Transfers carry no fee, so arrival is the only ordering. Entries that stop being a head are dropped
+    from the heap lazily when they surface.
+    """
+
+    def __init__(self, max_size=MEMPOOL_MAX_SIZE, max_per_account=MEMPOOL_MAX_PER_ACCOUNT):
+        self.max_size = max_size
+        self.max_per_account = max_per_account
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        self._by_id = {}
+        self._by_sender = {}
+        self._heads = []
+        # Selected or reserved for a block that has not been confirmed yet
+        self._in_flight = {}
+        self._in_flight_by_sender = Counter()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._by_id)
+
+    def __contains__(self, txn_id):
+        with self._lock:
+            return txn_id in self._by_id or txn_id in self._in_flight
+
+    def check_admission(self, sender, count=1):
+        """Raise before money moves if `count` more transactions from sender would not fit.
+
+        The check and the later add() are not atomic, so concurrent callers
+        may overshoot the limits slightly; add() never rejects a transaction
+        whose transfer has already been applied.
+        """
+        with self._lock:
+            if len(self._by_id) + len(self._in_flight) + count > self.max_size:
+                raise MempoolFullError("Too many transactions are waiting to be mined")
+            if sender != SYSTEM_ACCOUNT:
+                queued = len(self._by_sender.get(sender, ())) + self._in_flight_by_sender[sender]
+                if queued + count > self.max_per_account:
+                    raise AccountQueueFullError("Too many pending transactions for this account")
+
+    def add(self, tx):
+        """Queue tx behind the sender's earlier transactions; returns the pool size."""
+        with self._lock:
+            if tx.txn_id in self._by_id or tx.txn_id in self._in_flight:
+                return len(self._by_id)
+            self._insert(_Entry(next(self._seq), tx))
+            mempool_size.set(len(self._by_id))
+            return len(self._by_id)
+
+    def _insert(self, entry):
+        sender = entry.tx.sender["account"]
+        queue = self._by_sender.get(sender)
+        if queue is None:
+            queue = self._by_sender[sender] = deque()
+        if queue and queue[-1].seq > entry.seq:
+            # Requeued entries are older than anything queued since
+            position = next(i for i, queued in enumerate(queue) if queued.seq > entry.seq)
+            queue.insert(position, entry)
+        else:
+            queue.append(entry)
+        self._by_id[entry.tx.txn_id] = entry
+        if queue[0] is entry:
+            self._push_head(sender, entry)
+
+    def _push_head(self, sender, entry):
+        heapq.heappush(self._heads, (entry.seq, sender))
+
+    def select(self, limit=None):
+        """Take up to `limit` transactions for the next block, oldest first.
+
+        Selected transactions stay reserved until confirm() or requeue().
+        """
+        batch = []
+        with self._lock:
+            while self._heads and (limit is None or len(batch) < limit):
+                seq, sender = heapq.heappop(self._heads)
+                queue = self._by_sender.get(sender)
+                if not queue or queue[0].seq != seq:
+                    continue  # stale head
+                entry = queue.popleft()
+                del self._by_id[entry.tx.txn_id]
+                self._fly(entry)
+                batch.append(entry.tx)
+                if queue:
+                    self._push_head(sender, queue[0])
+                else:
+                    del self._by_sender[sender]
+            self._compact()
+            mempool_size.set(len(self._by_id))
+        return batch
+
+    def _fly(self, entry):
+        self._in_flight[entry.tx.txn_id] = entry
+        self._in_flight_by_sender[entry.tx.sender["account"]] += 1
+
+    def _land(self, txn_id):
+        entry = self._in_flight.pop(txn_id, None)
+        if entry is not None:
+            sender = entry.tx.sender["account"]
+            self._in_flight_by_sender[sender] -= 1
+            if not self._in_flight_by_sender[sender]:
+                del self._in_flight_by_sender[sender]
+        return entry
+
+    def reserve(self, txs):
+        """Count transactions mined outside select(), e.g. a batch given a block of its own, until confirm()."""
+        with self._lock:
+            for tx in txs:
+                if tx.txn_id not in self._by_id and tx.txn_id not in self._in_flight:
+                    self._fly(_Entry(next(self._seq), tx))
+
+    def confirm(self, txs):
+        """Forget transactions that made it into a block."""
+        with self._lock:
+            for tx in txs:
+                self._land(tx.txn_id)
+
+    def requeue(self, txs):
+        """Put back transactions whose block failed, in their original positions."""
+        with self._lock:
+            for tx in txs:
+                entry = self._land(tx.txn_id)
+                if entry is not None:
+                    self._insert(entry)
+            mempool_size.set(len(self._by_id))
+
+    def remove(self, txn_ids):
+        """Drop queued transactions, e.g. ones already found in a block."""
+        removed = 0
+        with self._lock:
+            for txn_id in txn_ids:
+                entry = self._by_id.pop(txn_id, None)
+                if entry is None:
+                    continue
+                sender = entry.tx.sender["account"]
+                queue = self._by_sender[sender]
+                was_head = queue[0] is entry
+                queue.remove(entry)
+                if not queue:
+                    del self._by_sender[sender]
+                elif was_head:
+                    self._push_head(sender, queue[0])
+                removed += 1
+            self._compact()
+            mempool_size.set(len(self._by_id))
+        return removed
+
+    def _compact(self):
+        # Stale heads are normally skipped on pop; rebuild if they pile up
+        if len(self._heads) > 2 * len(self._by_sender) + 64:
+            self._heads = [(queue[0].seq, sender) for sender, queue in self._by_sender.items()]
+            heapq.heapify(self._heads)
+
+    def pending_for(self, sender):
+        with self._lock:
+            return [entry.tx for entry in self._by_sender.get(sender, ())]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "pending": len(self._by_id),
+                "in_flight": len(self._in_flight),
+                "senders": len(self._by_sender),
+                "max_size": self.max_size,
+                "max_per_account": self.max_per_account,
+            }
@@ -0,0 +1,142 @@
+#models/signature_verifier.py
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from cryptography.exceptions import InvalidSignature
+from dotenv import load_dotenv
+from db import wallets_collection
+from utils.crypto_utils import load_public_key, verify_signature
+
+load_dotenv()
+
+PUBLIC_KEY_CACHE_SIZE = int(os.getenv("PUBLIC_KEY_CACHE_SIZE", 10000))
+VERIFY_WORKERS = int(os.getenv("VERIFY_WORKERS", os.cpu_count() or 1))
+
+# The login key never rotates. /set-pin replaces public_pin_key, bumps
+# pin_key_version and moves the old key to previous_pin_keys; transactions
+# record the pin_key_version that signed them.
+KEY_PROJECTION = {"_id": 0, "account_number": 1, "pin_key_version": 1}
+KEYS_PROJECTION = {"_id": 0, "account_number": 1, "pin_key_version": 1, "public_key": 1, "public_pin_key": 1,
+                   "previous_pin_keys": 1}
+
+
+class PublicKeyCache:
+    """LRU of an account's deserialized public keys, keyed by (account, current PIN key version)."""
+
+    def __init__(self, max_entries=PUBLIC_KEY_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._keys = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, cache_key):
+        with self._lock:
+            key = self._keys.get(cache_key)
+            if key is None:
+                self.misses += 1
+                return None
+            self._keys.move_to_end(cache_key)
+            self.hits += 1
+            return key
+
+    def put(self, cache_key, key):
+        with self._lock:
+            self._keys[cache_key] = key
+            self._keys.move_to_end(cache_key)
+            while len(self._keys) > self.max_entries:
+                self._keys.popitem(last=False)
+
+    def invalidate(self, account_number):
+        with self._lock:
+            for cache_key in [k for k in self._keys if k[0] == account_number]:
+                del self._keys[cache_key]
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._keys), "max_entries": self.max_entries, "hits": self.hits, "misses": self.misses}
+
+
+class SignatureVerifier:
+    def __init__(self, cache=None, workers=VERIFY_WORKERS):
+        self.cache = cache or PublicKeyCache()
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="verify")
+
+    @staticmethod
+    def signer_of(tx):
+        # Credits are signed by the receiving account, everything else by the sender
+        if tx["sender"]["account"] == "system":
+            return tx["receiver"]["account"]
+        return tx["sender"]["account"]
+
+    def load_keys(self, account_numbers):
+        """Return {account: {"login": key, "pin": {version: key}}}.
+
+        One query for current versions and one for cache misses.
+        """
+        account_numbers = list(set(account_numbers))
+        versions = {w["account_number"]: w.get("pin_key_version", 0)
+                    for w in wallets_collection.find({"account_number": {"$in": account_numbers}}, KEY_PROJECTION)}
+
+        keys = {}
+        missing = []
+        for account, version in versions.items():
+            cached = self.cache.get((account, version))
+            if cached is None:
+                missing.append(account)
+            else:
+                keys[account] = cached
+
+        if missing:
+            for wallet in wallets_collection.find({"account_number": {"$in": missing}}, KEYS_PROJECTION):
+                account = wallet["account_number"]
+                pin_keys = {entry["version"]: load_public_key(entry["public_pin_key"])
+                            for entry in wallet.get("previous_pin_keys", [])}
+                if wallet.get("public_pin_key"):
+                    pin_keys[wallet.get("pin_key_version", 0)] = load_public_key(wallet["public_pin_key"])
+                login_key = load_public_key(wallet["public_key"]) if wallet.get("public_key") else None
+                keys[account] = {"login": login_key, "pin": pin_keys}
+                self.cache.put((account, wallet.get("pin_key_version", 0)), keys[account])
+        return keys
+
+    @staticmethod
+    def _candidates(keys, tx):
+        version = tx.get("pin_key_version")
+        if version is not None:
+            return [keys["pin"].get(version)]
+        # Login-signed (credits, debits) or written before versions were recorded
+        return [keys["login"]] + [keys["pin"][v] for v in sorted(keys["pin"], reverse=True)]
+
+    @classmethod
+    def _verify_one(cls, keys, tx):
+        signature = tx.get("signature")
+        if not signature or not keys:
+            return False
+        message = tx["tx_hash"].encode()
+        for key in cls._candidates(keys, tx):
+            if key is None:
+                continue
+            try:
+                verify_signature(key, message, bytes(signature))
+                return True
+            except InvalidSignature:
+                continue
+        return False
+
+    def verify_transactions(self, txs):
+        """Verify a batch of transaction dicts concurrently; returns a bool per transaction."""
+        if not txs:
+            return []
+        keys = self.load_keys(self.signer_of(tx) for tx in txs)
+        # OpenSSL releases the GIL while verifying, so threads run in parallel
+        return list(self._pool.map(lambda tx: self._verify_one(keys.get(self.signer_of(tx)), tx), txs))
+
+    def verify(self, tx):
+        return self.verify_transactions([tx])[0]
+
+    def invalidate(self, account_number):
+        self.cache.invalidate(account_number)
+
+
+signature_verifier = SignatureVerifier()
@@ -2,14 +2,16 @@
 from datetime import datetime
 import hashlib
 from utils.crypto_utils import sign_message
-from db import transactions_collection
-import random
-import string
+from db import transactions_collection, transactions_read_collection
+from utils.id_generator import new_txn_id, NODE_ID
 import pytz
 
 class Transaction:
-    def __init__(self, sender_account, receiver_account, sender_name, receiver_name, amount, note, private_pin_key):
-        txn_id = "TXN" + ''.join(random.choices(string.ascii_lowercase + string.digits, k=8)).upper()
+    __slots__ = ("txn_id", "sender", "receiver", "amount", "note", "timestamp", "tx_hash", "signature", "pin_key_version")
+
+    def __init__(self, sender_account, receiver_account, sender_name, receiver_name, amount, note, private_pin_key,
+                 pin_key_version=None):
+        txn_id = new_txn_id()
         ist = pytz.timezone('Asia/Kolkata')
 
         self.txn_id = txn_id
@@ -26,6 +28,8 @@ class Transaction:
         self.timestamp = datetime.now(ist)
         self.tx_hash = self.calculate_hash()
         self.signature = None
+        # Which PIN key signed this, so verification survives a PIN change; None for login-key signatures
+        self.pin_key_version = pin_key_version
 
         if private_pin_key:
             self.signature = self.sign(private_pin_key)
@@ -41,9 +45,8 @@ class Transaction:
     def sign(self, private_pin_key):
         return sign_message(private_pin_key, self.tx_hash.encode())
 
-    def save_to_db(self):
-        # Save the transaction details to MongoDB
-        transaction_data = {
+    def to_dict(self):
+        return {
             "txn_id": self.txn_id,
             "sender": self.sender,
             "receiver": self.receiver,
@@ -51,48 +54,158 @@ class Transaction:
             "note": self.note,
             "timestamp": self.timestamp,
             "tx_hash": self.tx_hash,
-            "signature": self.signature
+            "signature": self.signature,
+            "pin_key_version": self.pin_key_version
         }
-        transactions_collection.insert_one(transaction_data)
+
+    def to_document(self):
+        transaction_data = self.to_dict()
+        transaction_data["status"] = "pending"
+        transaction_data["block_hash"] = None
+        # Pending documents double as the mempool's journal, partitioned by node
+        transaction_data["node"] = NODE_ID
+        return transaction_data
+
+    @classmethod
+    def from_document(cls, doc):
+        """Rebuild a transaction from its stored document, keeping its hash and signature."""
+        tx = cls.__new__(cls)
+        tx.txn_id = doc["txn_id"]
+        tx.sender = doc["sender"]
+        tx.receiver = doc["receiver"]
+        tx.amount = doc["amount"]
+        tx.note = doc.get("note")
+        tx.timestamp = doc["timestamp"]
+        tx.tx_hash = doc["tx_hash"]
+        tx.signature = doc.get("signature")
+        tx.pin_key_version = doc.get("pin_key_version")
+        return tx
+
+    def save_to_db(self, session=None):
+        # Save the transaction details to MongoDB
+        transactions_collection.insert_one(self.to_document(), session=session)
+
+    @staticmethod
+    def save_many(transactions, session=None):
+        if transactions:
+            transactions_collection.insert_many([tx.to_document() for tx in transactions], session=session)
+
+    @staticmethod
+    def discard(txn_ids):
+        """Delete still-pending transactions whose transfer was rolled back."""
+        if txn_ids:
+            transactions_collection.delete_many({"txn_id": {"$in": txn_ids}, "status": "pending"})
+
+    @staticmethod
+    def mark_confirmed(txn_ids, block_hash):
+        if not txn_ids:
+            return
+        transactions_collection.update_many(
+            {"txn_id": {"$in": txn_ids}},
+            {"$set": {"status": "confirmed", "block_hash": block_hash, "confirmed_at": datetime.now(pytz.timezone('Asia/Kolkata'))}}
+        )
+
+    @staticmethod
+    def pending_owners():
+        """Nodes holding pending transactions; None stands for ones written before nodes were recorded."""
+        return set(transactions_collection.distinct("node", {"status": "pending"})) | {None}
+
+    @staticmethod
+    def adopt_pending(from_node, node):
+        """Move from_node's pending transactions to node, returning those this call moved, oldest first.
+
+        Each document moves at most once, so concurrent adopters split the set.
+        """
+        query = {"status": "pending", "node": from_node}
+        txn_ids = [doc["txn_id"] for doc in transactions_collection.find(query, {"_id": 0, "txn_id": 1})]
+        if not txn_ids:
+            return []
+        transactions_collection.update_many({"txn_id": {"$in": txn_ids}, **query},
+                                            {"$set": {"node": node, "claim": None}})
+        cursor = transactions_collection.find({"txn_id": {"$in": txn_ids}, "status": "pending", "node": node})
+        return [Transaction.from_document(doc) for doc in cursor.sort([("timestamp", 1), ("_id", 1)])]
+
+    @staticmethod
+    def claim(txn_ids, node, claim_id):
+        """Reserve node's pending, unclaimed transactions for one block; returns the txn_ids reserved."""
+        transactions_collection.update_many(
+            {"txn_id": {"$in": txn_ids}, "status": "pending", "node": node, "claim": None},
+            {"$set": {"claim": claim_id}})
+        return {doc["txn_id"] for doc in transactions_collection.find(
+            {"txn_id": {"$in": txn_ids}, "claim": claim_id}, {"_id": 0, "txn_id": 1})}
+
+    @staticmethod
+    def release_claim(txn_ids, claim_id):
+        transactions_collection.update_many({"txn_id": {"$in": txn_ids}, "claim": claim_id, "status": "pending"},
+                                            {"$set": {"claim": None}})
+
+    @staticmethod
+    def find_by_txn_id(txn_id):
+        return transactions_collection.find_one({"txn_id": txn_id})
+
+    @staticmethod
+    def find_by_txn_ids(txn_ids):
+        return list(transactions_collection.find({"txn_id": {"$in": txn_ids}}))
+
+    @staticmethod
+    def _history_pipeline(account_number, start=None, end=None, counterparty=None, before=None, limit=None,
+                          ascending=False):
+        # One $or branch per side so each can use its (account, timestamp) index
+        branches = []
+        for own_side, other_side in (("sender", "receiver"), ("receiver", "sender")):
+            branch = {f"{own_side}.account": account_number}
+            if counterparty:
+                branch[f"{other_side}.account"] = counterparty
+            if start or end:
+                branch["timestamp"] = {}
+                if start:
+                    branch["timestamp"]["$gte"] = start
+                if end:
+                    branch["timestamp"]["$lt"] = end
+            if before:
+                timestamp, object_id = before
+                branch["$or"] = [
+                    {"timestamp": {"$lt": timestamp}},
+                    {"timestamp": timestamp, "_id": {"$lt": object_id}}
+                ]
+            branches.append(branch)
+
+        pipeline = [
+            {"$match": {"$or": branches}},
+            {"$sort": {"timestamp": 1, "_id": 1} if ascending else {"timestamp": -1, "_id": -1}},
+        ]
+        if limit:
+            pipeline.append({"$limit": limit})
+        pipeline.append({"$project": {
+            "_id": {"$toString": "$_id"},
+            "txn_id": 1,
+            "amount": 1,
+            "note": 1,
+            "receiver": 1,
+            "sender": 1,
+            "timestamp": 1,
+            "status": 1,
+            "type": {"$cond": [{"$eq": ["$sender.account", account_number]}, "send", "received"]}
+        }})
+        return pipeline
 
     @staticmethod
     def find_by_account_number(account_number):
-        transactions = transactions_collection.find({
-            "$or": [
-                {"sender.account": account_number},
-                {"receiver.account": account_number}
-            ]
-        })
-
-        allowed_keys = {
-            "amount",
-            "note",
-            "receiver",
-            "sender",
-            "timestamp",
-            "_id"
-        }
+        return list(transactions_read_collection.aggregate(Transaction._history_pipeline(account_number)))
 
-        serialized_transactions = []
-        for txn in transactions:
-            txn["_id"] = str(txn["_id"])
-
-            clean_txn = {}
-            for key in allowed_keys:
-                if key in txn:
-                    value = txn[key]
-                    if isinstance(value, bytes):
-                        try:
-                            value = value.decode("utf-8")
-                        except Exception:
-                            value = str(value)
-                    clean_txn[key] = value
-
-            if "sender" in txn and isinstance(txn["sender"], dict) and txn["sender"].get("account") == account_number:
-                clean_txn["type"] = "send"
-            elif "receiver" in txn and isinstance(txn["receiver"], dict) and txn["receiver"].get("account") == account_number:
-                clean_txn["type"] = "received"
-
-            serialized_transactions.append(clean_txn)
-
-        return serialized_transactions
+    @staticmethod
+    def find_page(account_number, limit, before=None, start=None, end=None, counterparty=None):
+        """Newest-first page of an account's history, keyset-paginated on (timestamp, _id).
+
+        `before` is the (timestamp, ObjectId) of the last row of the previous
+        page. Returns (rows, has_more).
+        """
+        pipeline = Transaction._history_pipeline(account_number, start, end, counterparty, before, limit + 1)
+        rows = list(transactions_read_collection.aggregate(pipeline))
+        return rows[:limit], len(rows) > limit
+
+    @staticmethod
+    def iter_statement(account_number, start=None, end=None, batch_size=500):
+        """Oldest-first cursor over an account's history, fetched in batches."""
+        pipeline = Transaction._history_pipeline(account_number, start, end, ascending=True)
+        return transactions_read_collection.aggregate(pipeline, batchSize=batch_size)
@@ -0,0 +1,143 @@
+#models/transfer_engine.py
+import os
+import time
+from pymongo.read_concern import ReadConcern
+from pymongo.write_concern import WriteConcern
+from dotenv import load_dotenv
+from db import client
+from models.wallet import Wallet
+from models.ledger import Ledger
+from models.transaction import Transaction
+from utils.metrics import span_seconds
+
+load_dotenv()
+
+# Multi-document transactions need a replica set; standalone servers fall
+# back to a conditional debit with a compensating credit on failure.
+USE_MONGO_TRANSACTIONS = os.getenv("USE_MONGO_TRANSACTIONS", "true").lower() == "true"
+SYSTEM_ACCOUNT = "system"
+
+
+class InsufficientFundsError(Exception):
+    pass
+
+
+class AccountNotFoundError(Exception):
+    pass
+
+
+class _PhaseTimer:
+    def __init__(self):
+        self.timings = {}
+        self._last = time.perf_counter()
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.timings[phase] = round((now - self._last) * 1000, 3)
+        span_seconds.observe(now - self._last, "transfer." + phase.removesuffix("_ms"))
+        self._last = now
+
+
+def _apply(tx, amount, timer, session=None, applied=None):
+    sender = tx.sender["account"]
+    receiver = tx.receiver["account"]
+
+    if sender != SYSTEM_ACCOUNT:
+        if Wallet.debit_if_sufficient(sender, amount, session=session) is None:
+            raise InsufficientFundsError(sender)
+        applied.append((sender, amount))
+        timer.mark("debit_ms")
+
+    if receiver != SYSTEM_ACCOUNT:
+        if Wallet.update_balance(receiver, amount, session=session).matched_count != 1:
+            raise AccountNotFoundError(receiver)
+        applied.append((receiver, -amount))
+        timer.mark("credit_ms")
+
+    tx.save_to_db(session=session)
+    Ledger.record(tx, amount, session=session)
+    timer.mark("ledger_ms")
+
+
+def _apply_batch(sender, tx_amounts, timer, session=None, applied=None):
+    total = sum(amount for _, amount in tx_amounts)
+    if Wallet.debit_if_sufficient(sender, total, session=session) is None:
+        raise InsufficientFundsError(sender)
+    applied.append((sender, total))
+    timer.mark("debit_ms")
+
+    credits = {}
+    for tx, amount in tx_amounts:
+        credits[tx.receiver["account"]] = credits.get(tx.receiver["account"], 0) + amount
+    matched = Wallet.credit_many(credits, session=session)
+    applied.extend((account_number, -amount) for account_number, amount in credits.items())
+    if matched != len(credits):
+        found = Wallet.find_many_by_account_numbers(credits)
+        raise AccountNotFoundError(next(account_number for account_number in credits if account_number not in found))
+    timer.mark("credit_ms")
+
+    Transaction.save_many([tx for tx, _ in tx_amounts], session=session)
+    Ledger.record_many(tx_amounts, session=session)
+    timer.mark("ledger_ms")
+
+
+def _run_atomic(apply, accounts, txn_ids):
+    timer = _PhaseTimer()
+    attempts = 0
+
+    if not USE_MONGO_TRANSACTIONS:
+        applied = []
+        try:
+            apply(timer, None, applied)
+        except Exception:
+            # Undo whatever balance changes already went through, and drop
+            # any transaction or ledger records written before the failure
+            for account_number, reversal in applied:
+                Wallet.update_balance(account_number, reversal)
+            Transaction.discard(txn_ids)
+            Ledger.discard(txn_ids)
+            raise
+        attempts = 1
+    else:
+        def callback(session):
+            nonlocal attempts
+            attempts += 1
+            timer.timings.clear()
+            timer._last = time.perf_counter()
+            apply(timer, session, [])
+
+        with client.start_session() as session:
+            # with_transaction retries TransientTransactionError and unknown commit results
+            session.with_transaction(
+                callback,
+                read_concern=ReadConcern("snapshot"),
+                write_concern=WriteConcern("majority")
+            )
+        timer.mark("commit_ms")
+
+    # Reads between the in-session writes and the commit may have re-cached old balances
+    Wallet.invalidate_cache(*accounts)
+    timer.timings["attempts"] = attempts
+    return timer.timings
+
+
+def execute_transfer(tx, amount):
+    """Debit the sender, credit the receiver and record tx as one unit.
+
+    Either side may be the "system" account (credits and debits), which has
+    no wallet. Returns per-phase timings in milliseconds.
+    """
+    return _run_atomic(
+        lambda timer, session, applied: _apply(tx, amount, timer, session, applied),
+        [tx.sender["account"], tx.receiver["account"]],
+        [tx.txn_id]
+    )
+
+
+def execute_batch(sender, tx_amounts):
+    """Debit the batch total once, credit every receiver and record all transactions as one unit."""
+    return _run_atomic(
+        lambda timer, session, applied: _apply_batch(sender, tx_amounts, timer, session, applied),
+        [sender] + [tx.receiver["account"] for tx, _ in tx_amounts],
+        [tx.txn_id for tx, _ in tx_amounts]
+    )
@@ -1,16 +1,29 @@
 #models/wallet.py
-import random
 import base64
 from datetime import datetime
 from db import wallets_collection
-from utils.crypto_utils import generate_keys, serialize_private_key
+from utils.crypto_utils import serialize_private_key
+from utils.key_pool import take_keys
+from utils.account_cache import account_cache
+from utils.id_generator import new_account_number
 from cryptography.hazmat.primitives import serialization
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+# What the cached read paths need. Keys, salts and the PIN hash stay out of
+# the cache, which with the redis backend lives outside this process. So
+# does the balance: it changes on every transfer and is read with
+# find_balance() instead.
+PROFILE_PROJECTION = {"_id": 1, "account_number": 1, "first_name": 1, "last_name": 1, "full_name": 1, "email": 1,
+                      "created_at": 1, "has_set_pin": 1, "pin_key_version": 1, "total_earned": 1,
+                      "current_points": 1, "link_spendless": 1}
+
 
 class Wallet:
     def __init__(self, password, firstname, lastname, fullname, email):
         # Generate a 12-digit unique account number
         self.account_number = self.generate_unique_account_number()
-        self.private_key, self.public_key = generate_keys() 
+        self.private_key, self.public_key = take_keys()
         self.password = password
         self.firstname = firstname
         self.lastname = lastname
@@ -20,10 +33,8 @@ class Wallet:
         self.created_at = datetime.now()  
 
     def generate_unique_account_number(self):
-        while True:
-            account_number = str(random.randint(100000000000, 999999999999))  
-            if wallets_collection.find_one({"account_number": account_number}) is None:
-                return account_number  
+        # Time-ordered and unique per shard; no lookup needed
+        return new_account_number()
 
     def save_to_db(self):
         encrypted_private_key, salt = serialize_private_key(self.private_key, self.password)
@@ -45,19 +56,85 @@ class Wallet:
             "has_set_pin": False,
         }
         
-        wallets_collection.insert_one(wallet_data)
+        while True:
+            try:
+                wallets_collection.insert_one(wallet_data)
+                return
+            except DuplicateKeyError as e:
+                # Only a clash with an old randomly assigned number is retried
+                if "account_number" not in (e.details or {}).get("keyPattern", {}):
+                    raise
+                self.account_number = wallet_data["account_number"] = self.generate_unique_account_number()
+                wallet_data.pop("_id", None)
 
     @staticmethod
     def find_by_account_number(account_number):
-        return wallets_collection.find_one({"account_number": account_number})
-    
+        """Cached profile without the balance; use find_with_keys when key material is needed."""
+        return account_cache.get_account(
+            account_number, lambda n: wallets_collection.find_one({"account_number": n}, PROFILE_PROJECTION)
+        )
+
     @staticmethod
     def find_by_email(email):
+        return account_cache.get_by_email(
+            email, lambda e: wallets_collection.find_one({"email": e}, PROFILE_PROJECTION)
+        )
+
+    @staticmethod
+    def find_balance(account_number):
+        """Current balance from the primary, or None if there is no such wallet."""
+        wallet = wallets_collection.find_one({"account_number": account_number}, {"_id": 0, "balance": 1})
+        return wallet.get("balance", 0) if wallet else None
+
+    @staticmethod
+    def find_with_keys(account_number):
+        return wallets_collection.find_one({"account_number": account_number})
+
+    @staticmethod
+    def find_with_keys_by_email(email):
         return wallets_collection.find_one({"email": email})
 
     @staticmethod
-    def update_balance(account_number, amount_change):
-        wallets_collection.update_one(
+    def invalidate_cache(*account_numbers):
+        account_cache.invalidate(*account_numbers)
+
+    @staticmethod
+    def find_many_by_account_numbers(account_numbers):
+        wallets = wallets_collection.find({"account_number": {"$in": list(account_numbers)}})
+        return {wallet["account_number"]: wallet for wallet in wallets}
+
+    @staticmethod
+    def update_balance(account_number, amount_change, session=None):
+        result = wallets_collection.update_one(
             {"account_number": account_number},
-            {"$inc": {"balance": amount_change}}
-        )
\ No newline at end of file
+            {"$inc": {"balance": amount_change}},
+            session=session
+        )
+        account_cache.invalidate(account_number)
+        return result
+
+    @staticmethod
+    def debit_if_sufficient(account_number, amount, session=None):
+        # Conditional on the balance so concurrent debits can never overdraw
+        result = wallets_collection.find_one_and_update(
+            {"account_number": account_number, "balance": {"$gte": amount}},
+            {"$inc": {"balance": -amount}},
+            projection={"_id": 0, "balance": 1},
+            session=session
+        )
+        account_cache.invalidate(account_number)
+        return result
+
+    @staticmethod
+    def credit_many(amounts_by_account, session=None):
+        """Apply several credits in one bulk write; returns the number of wallets matched."""
+        if not amounts_by_account:
+            return 0
+        result = wallets_collection.bulk_write(
+            [UpdateOne({"account_number": account_number}, {"$inc": {"balance": amount}})
+             for account_number, amount in amounts_by_account.items()],
+            ordered=False,
+            session=session
+        )
+        account_cache.invalidate(*amounts_by_account)
+        return result.matched_count
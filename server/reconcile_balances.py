@@ -0,0 +1,17 @@
+#reconcile_balances.py
+import argparse
+import json
+from models.ledger import Ledger, RECONCILE_WORKERS
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare ledger-derived balances with stored wallet balances.")
+    parser.add_argument("--workers", type=int, default=RECONCILE_WORKERS, help="parallel reconciliation threads")
+    parser.add_argument("--snapshot", type=int, metavar="HEIGHT", help="take a balance snapshot at HEIGHT first")
+    args = parser.parse_args()
+
+    if args.snapshot is not None:
+        print(f"Snapshot at height {args.snapshot}: {Ledger.take_snapshot(args.snapshot)} accounts")
+
+    report = Ledger.reconcile(workers=args.workers)
+    print(json.dumps(report, indent=2, default=str))
+    raise SystemExit(0 if not report["mismatched"] else 1)
@@ -1,13 +1,20 @@
 #routes/accounts_routes.py
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context, g
 from models.wallet import Wallet
 from models.transaction import Transaction
 from flask_cors import cross_origin
-from utils.jwt_utils import decode_token
+from utils.auth import require_auth
 from db import wallets_collection
+from utils.pagination import parse_date
+from datetime import datetime
+import csv
+import io
+import json
 
 accounts_bp = Blueprint('accounts', __name__)
 
+STATEMENT_COLUMNS = ["txn_id", "timestamp", "type", "amount", "counterparty_account", "counterparty_name", "note", "status"]
+
 @accounts_bp.route("/verify", methods=["GET"])
 @cross_origin(
     origins=["http://localhost:3000", "https://depayment.vercel.app"],
@@ -40,9 +47,9 @@ def verify_account():
     origins=["http://localhost:3000", "https://depayment.vercel.app"],
     supports_credentials=True
 )
+@require_auth
 def get_account_details():
-    token = request.headers.get("Authorization").split(" ")[1]
-    decoded = decode_token(token)
+    decoded = g.claims
 
     account_number = decoded["account_number"]
 
@@ -59,7 +66,7 @@ def get_account_details():
             "last_name": account["last_name"],
             "full_name": account["full_name"],
             "email": account["email"],
-            "balance": account["balance"],
+            "balance": Wallet.find_balance(account_number) or 0,
         }), 200
     else:
         return jsonify({
@@ -72,17 +79,9 @@ def get_account_details():
     origins=["http://localhost:3000", "https://depayment.vercel.app"],
     supports_credentials=True
 )
+@require_auth
 def get_transactions():
-    auth_header = request.headers.get("Authorization")
-    if not auth_header or not auth_header.startswith("Bearer "):
-        return jsonify({"success": False, "error": "Authorization header missing or invalid"}), 401
-
-    try:
-        token = auth_header.split(" ")[1]
-        decoded = decode_token(token)
-        account_number = decoded.get("account_number")
-    except Exception as e:
-        return jsonify({"success": False, "error": "Invalid token"}), 401
+    account_number = g.account_number
 
     if not account_number:
         return jsonify({"success": False, "error": "Account number is required"}), 400
@@ -100,15 +99,80 @@ def get_transactions():
             "error": "No transactions found for this account"
         }), 404
     
+def _statement_row(txn):
+    counterparty = txn["receiver"] if txn["type"] == "send" else txn["sender"]
+    timestamp = txn.get("timestamp")
+    return {
+        "txn_id": txn.get("txn_id"),
+        "timestamp": timestamp.isoformat() if isinstance(timestamp, datetime) else timestamp,
+        "type": txn["type"],
+        "amount": txn.get("amount"),
+        "counterparty_account": counterparty.get("account"),
+        "counterparty_name": counterparty.get("name"),
+        "note": txn.get("note"),
+        "status": txn.get("status"),
+    }
+
+
+def _ndjson_lines(transactions):
+    for txn in transactions:
+        yield json.dumps(_statement_row(txn)) + "\n"
+
+
+def _csv_lines(transactions):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=STATEMENT_COLUMNS)
+    writer.writeheader()
+    for txn in transactions:
+        writer.writerow(_statement_row(txn))
+        # Hand each row off as soon as it is written so memory stays flat
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+@accounts_bp.route('/statement', methods=['GET'])
+@cross_origin(
+    origins=["http://localhost:3000", "https://depayment.vercel.app"],
+    supports_credentials=True
+)
+@require_auth
+def export_statement():
+    account_number = g.account_number
+
+    export_format = request.args.get("format", "ndjson")
+    if export_format not in ("ndjson", "csv"):
+        return jsonify({"success": False, "error": "format must be ndjson or csv"}), 400
+
+    try:
+        start = parse_date(request.args.get("from"))
+        end = parse_date(request.args.get("to"))
+    except ValueError:
+        return jsonify({"success": False, "error": "from/to must be ISO dates"}), 400
+
+    transactions = Transaction.iter_statement(account_number, start, end)
+    if export_format == "csv":
+        body, mimetype = _csv_lines(transactions), "text/csv"
+    else:
+        body, mimetype = _ndjson_lines(transactions), "application/x-ndjson"
+
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename=statement-{account_number}.{export_format}"}
+    )
+
+
 @accounts_bp.route("/connect/spendless", methods=["POST", "OPTIONS"])
 @cross_origin(
     origins=["http://localhost:3000", "https://depayment.vercel.app"],
     supports_credentials=True
 )
+@require_auth
 def connect_spendless():
     data = request.get_json()
-    token = request.headers.get("Authorization").split(" ")[1]
-    decoded = decode_token(token)
+    decoded = g.claims
 
     account_number = decoded["account_number"]
     total_earned = data.get("totalEarned")
@@ -125,6 +189,7 @@ def connect_spendless():
         {"_id": account["_id"]},
         {"$set": {"total_earned": total_earned, "current_points": current_points, "link_spendless": link_spendless}}
     )
+    Wallet.invalidate_cache(account_number)
 
     if account:
         return jsonify({
@@ -146,9 +211,9 @@ def connect_spendless():
     origins=["http://localhost:3000", "https://depayment.vercel.app"],
     supports_credentials=True
 )
+@require_auth
 def details_spendless():
-    token = request.headers.get("Authorization").split(" ")[1]
-    decoded = decode_token(token)
+    decoded = g.claims
 
     account_number = decoded["account_number"]
 
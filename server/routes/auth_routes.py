@@ -1,18 +1,23 @@
 #routes/auth_routes.py
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, g
 from models.wallet import Wallet
 from utils.jwt_utils import generate_token
-from utils.jwt_utils import decode_token
-from utils.crypto_utils import serialize_private_key, generate_keys
+from utils.jwt_utils import verify_token, revoke_token
+from utils.auth import require_auth, bearer_token
+from utils.crypto_utils import serialize_private_key
+from utils.key_pool import key_pool, take_keys
 from cryptography.hazmat.primitives import serialization
 from db import wallets_collection
 from utils.hashed import hash_pin
 from utils.hashed import verify_pin
+from utils.key_cache import signing_key_cache, unlock_private_key
+from models.signature_verifier import signature_verifier
 import base64
 import jwt
 from flask_cors import cross_origin
 
 auth_bp = Blueprint('auth', __name__)
+key_pool.start()
 
 import re
 
@@ -62,18 +67,18 @@ def login():
     email = data.get("email")
     password = data.get("password")
 
-    wallet_data = Wallet.find_by_email(email)
-    account_number = wallet_data["account_number"]
+    wallet_data = Wallet.find_with_keys_by_email(email)
 
     if not wallet_data:
         return jsonify({"error": "Wallet not found."}), 404
 
+    account_number = wallet_data["account_number"]
+
     try:
         encrypted_pem = base64.b64decode(wallet_data['encrypted_private_key'])
         salt = base64.b64decode(wallet_data['salt'])
-        # Decrypt to validate password
-        from utils.crypto_utils import decrypt_private_key
-        decrypt_private_key(encrypted_pem, password, salt)
+        # Decrypt to validate password (also warms the key cache for /credit and /debit)
+        unlock_private_key(account_number, encrypted_pem, password, salt)
     except Exception as e:
         return jsonify({"error": "Invalid password."}), 401
 
@@ -86,28 +91,37 @@ def login():
     supports_credentials=True
 )
 def validate_token():
-    auth_header = request.headers.get("Authorization")
-    if not auth_header:
+    token = bearer_token()
+    if not token:
         return jsonify({"message": "No token provided"}), 401
 
-    token = auth_header.split(" ")[1]
-
     try:
-        decoded = decode_token(token)
+        decoded = verify_token(token)
         return jsonify({"valid": True, "email": decoded["account_number"]})
     except jwt.ExpiredSignatureError:
         return jsonify({"message": "Token expired"}), 401
     except jwt.InvalidTokenError:
         return jsonify({"message": "Invalid token"}), 403
 
+@auth_bp.route("/logout", methods=["POST", "OPTIONS"])
+@cross_origin(
+    origins=["http://localhost:3000", "https://depayment.vercel.app"],
+    supports_credentials=True
+)
+@require_auth
+def logout():
+    # Rejected by every worker from its next revocation sync on
+    revoke_token(bearer_token())
+    return jsonify({"message": "Logged out"}), 200
+
 @auth_bp.route("/set-pin", methods=["POST", "OPTIONS"])
 @cross_origin(
     origins=["http://localhost:3000", "https://depayment.vercel.app"],
     supports_credentials=True
 )
+@require_auth
 def set_pin():
-    token = request.headers.get("Authorization").split(" ")[1]
-    decoded = decode_token(token)
+    decoded = g.claims
 
     data = request.get_json()
     account_number = decoded["account_number"]
@@ -125,33 +139,39 @@ def set_pin():
     if not wallet:
         return jsonify({"error": "Wallet not found for account number"}), 404
     
-    # Update has_set_pin to True
-    wallets_collection.update_one(
-        {"_id": wallet["_id"]},
-        {"$set": {"has_set_pin": True}}
-    )
-    
     hashed_pin = hash_pin(pin)
 
-    wallets_collection.update_one(
-        {"_id": wallet["_id"]},
-        {"$set": {"pin": hashed_pin}}
-    )
-
-    private_pin_key, public_pin_key = generate_keys() 
+    private_pin_key, public_pin_key = take_keys()
 
     encrypted_private_pin_key, salt_pin = serialize_private_key(private_pin_key, pin)
 
-    wallets_collection.update_one(
-        {"_id": wallet["_id"]},
-        {"$set": {
-        "encrypted_private_pin_key": base64.b64encode(encrypted_private_pin_key).decode(),
-        "salt_pin": base64.b64encode(salt_pin).decode(),
-        "public_pin_key": public_pin_key.public_bytes(
-            encoding=serialization.Encoding.PEM,
-            format=serialization.PublicFormat.SubjectPublicKeyInfo
-        ).decode().strip().replace('-----BEGIN PUBLIC KEY-----\n', '').replace('\n-----END PUBLIC KEY-----', '')
-    }})
+    update = {
+        "$set": {
+            "has_set_pin": True,
+            "pin": hashed_pin,
+            "encrypted_private_pin_key": base64.b64encode(encrypted_private_pin_key).decode(),
+            "salt_pin": base64.b64encode(salt_pin).decode(),
+            "public_pin_key": public_pin_key.public_bytes(
+                encoding=serialization.Encoding.PEM,
+                format=serialization.PublicFormat.SubjectPublicKeyInfo
+            ).decode().strip().replace('-----BEGIN PUBLIC KEY-----\n', '').replace('\n-----END PUBLIC KEY-----', '')
+        },
+        "$inc": {"pin_key_version": 1}
+    }
+    # Transactions signed with the old key still have to verify
+    if wallet.get("public_pin_key"):
+        update["$push"] = {"previous_pin_keys": {"version": wallet.get("pin_key_version", 0),
+                                                 "public_pin_key": wallet["public_pin_key"]}}
+    # Conditional on the version we read, so two concurrent changes can't both archive the same key
+    result = wallets_collection.update_one({"_id": wallet["_id"], "pin_key_version": wallet.get("pin_key_version")},
+                                           update)
+    if result.matched_count == 0:
+        return jsonify({"error": "PIN was changed concurrently, please retry"}), 409
+
+    # Keys unlocked with the old PIN must not outlive it
+    signing_key_cache.invalidate(account_number, "pin")
+    signature_verifier.invalidate(account_number)
+    Wallet.invalidate_cache(account_number)
 
     return jsonify({
         "message": "PIN successfully set",
@@ -163,9 +183,9 @@ def set_pin():
     origins=["http://localhost:3000", "https://depayment.vercel.app"],
     supports_credentials=True
 )
+@require_auth
 def verify_wallet_pin():
-    token = request.headers.get("Authorization").split(" ")[1]
-    decoded = decode_token(token)
+    decoded = g.claims
 
     data = request.get_json()
     account_number = decoded["account_number"]
@@ -1,35 +1,47 @@
 #routes/blockchain_routes.py
-from flask import Blueprint, request, jsonify
-from models.blockchain import Blockchain
+from flask import Blueprint, request, jsonify, g
+from models.blockchain import Blockchain, BlockProducer, BLOCK_MAX_TRANSACTIONS
+from models.chain_validator import ChainValidator
+from models.signature_verifier import signature_verifier
+from models.ledger import Ledger
+from models.transfer_engine import execute_transfer, execute_batch, InsufficientFundsError, AccountNotFoundError
 from models.transaction import Transaction
 from models.wallet import Wallet
-from utils.crypto_utils import decrypt_private_key
-from utils.jwt_utils import decode_token
-from db import transactions_collection
+from utils.key_cache import unlock_private_key, unlock_private_pin_key
+from utils.crypto_utils import sign_messages
+from utils.auth import require_auth
+from utils.pool_metrics import pool_metrics
+from utils.idempotency import idempotent
+from utils.pagination import encode_cursor, decode_cursor, parse_date, InvalidCursorError
 import base64
+import hmac
+import os
+import time
 from flask_cors import cross_origin
 
 blockchain_bp = Blueprint('blockchain', __name__)
+MAX_BULK_VERIFY = 500
+# A batch is mined as one block of its own
+MAX_BATCH_PAYMENTS = min(500, BLOCK_MAX_TRANSACTIONS)
+DEFAULT_HISTORY_PAGE = 20
+MAX_HISTORY_PAGE = 100
 bank_chain = Blockchain()
+block_producer = BlockProducer(bank_chain)
+block_producer.start()
 
 @blockchain_bp.route("/transaction", methods=["POST", "OPTIONS"])
 @cross_origin(
     origins=["http://localhost:3000", "https://depayment.vercel.app"],
     supports_credentials=True
 )
+@require_auth
+@idempotent("transaction")
 def create_transaction():
-    token = request.headers.get("Authorization").split(" ")[1]
-    decoded = decode_token(token)
-
-    sender_data = Wallet.find_by_account_number(decoded["account_number"])
-    receiver_data = Wallet.find_by_account_number(request.json.get("receiver_account"))
-    if not sender_data or not receiver_data:
-        return jsonify({"error": "Invalid sender or receiver account"}), 404
+    started = time.perf_counter()
+    decoded = g.claims
 
     data = request.get_json()
     sender_account = decoded["account_number"]
-    sender_name = f"{sender_data.get('first_name', 'Unknown')} {sender_data.get('last_name', '')}".strip()
-    receiver_name = f"{receiver_data.get('first_name', 'Unknown')} {receiver_data.get('last_name', '')}".strip()
     receiver_account = data.get("receiver_account")
     amount = data.get("amount")
     note = data.get("note")
@@ -41,33 +53,167 @@ def create_transaction():
     if not all([receiver_account, amount]):
         return jsonify({"error": "Missing receiver or amount"}), 400
 
-    wallet_data = Wallet.find_by_account_number(sender_account)
-    if not wallet_data:
-        return jsonify({"error": "Sender wallet not found"}), 404
+    if isinstance(amount, bool) or not isinstance(amount, (int, float)) or amount <= 0:
+        return jsonify({"error": "Amount must be a positive number"}), 400
+
+    if receiver_account == sender_account:
+        return jsonify({"error": "Cannot transfer to the same account"}), 400
+
+    # Both wallets in one round trip
+    wallets = Wallet.find_many_by_account_numbers([sender_account, receiver_account])
+    sender_data = wallets.get(sender_account)
+    receiver_data = wallets.get(receiver_account)
+    if not sender_data or not receiver_data:
+        return jsonify({"error": "Invalid sender or receiver account"}), 404
+    lookup_done = time.perf_counter()
 
-    encrypted_pem = base64.b64decode(wallet_data['encrypted_private_pin_key'])
-    salt_pin = base64.b64decode(wallet_data['salt_pin'])
-    private_pin_key = decrypt_private_key(encrypted_pem, pin, salt_pin)
+    sender_name = f"{sender_data.get('first_name', 'Unknown')} {sender_data.get('last_name', '')}".strip()
+    receiver_name = f"{receiver_data.get('first_name', 'Unknown')} {receiver_data.get('last_name', '')}".strip()
+
+    # Cheap early exit; the debit itself re-checks the balance atomically
+    if sender_data.get('balance', 0) < amount:
+        return jsonify({"error": "Insufficient balance"}), 400
+
+    encrypted_pem = base64.b64decode(sender_data['encrypted_private_pin_key'])
+    salt_pin = base64.b64decode(sender_data['salt_pin'])
+    private_pin_key = unlock_private_pin_key(sender_account, encrypted_pem, pin, salt_pin)
 
-    sender_balance = wallet_data.get('balance', 0)
+    # Refuse before any money moves if the sender's queue is already full
+    bank_chain.mempool.check_admission(sender_account)
+    tx = Transaction(sender_account, receiver_account, sender_name, receiver_name, amount, note, private_pin_key,
+                     pin_key_version=sender_data.get("pin_key_version", 0))
+    sign_done = time.perf_counter()
 
-    if sender_balance < amount:
+    try:
+        timings = execute_transfer(tx, amount)
+    except InsufficientFundsError:
         return jsonify({"error": "Insufficient balance"}), 400
+    except AccountNotFoundError:
+        return jsonify({"error": "Receiver wallet not found"}), 404
 
-    receiver_wallet_data = Wallet.find_by_account_number(receiver_account)
-    if not receiver_wallet_data:
-        return jsonify({"error": "Receiver wallet not found"}), 404    
+    block_producer.submit(tx)
 
-    tx = Transaction(sender_account, receiver_account, sender_name, receiver_name, amount, note, private_pin_key)
-    tx.save_to_db()
+    timings = {
+        "lookup_ms": round((lookup_done - started) * 1000, 3),
+        "sign_ms": round((sign_done - lookup_done) * 1000, 3),
+        **timings,
+        "total_ms": round((time.perf_counter() - started) * 1000, 3)
+    }
+
+    return jsonify({"message": "Transaction created, balances updated.", "txn_id": tx.txn_id, "time": tx.timestamp, "status": "pending", "timings": timings}), 201
+
+
+@blockchain_bp.route("/batch-transaction", methods=["POST", "OPTIONS"])
+@cross_origin(
+    origins=["http://localhost:3000", "https://depayment.vercel.app"],
+    supports_credentials=True
+)
+@require_auth
+@idempotent("batch-transaction")
+def create_batch_transaction():
+    started = time.perf_counter()
+    decoded = g.claims
 
-    Wallet.update_balance(sender_account, -amount)
-    Wallet.update_balance(receiver_account, amount)
+    data = request.get_json()
+    sender_account = decoded["account_number"]
+    payments = data.get("payments")
+    pin = data.get("pin")
 
-    bank_chain.add_transaction(tx)
-    bank_chain.mine_pending_transactions(sender_account)
+    if not pin:
+        return jsonify({"error": "Pin is required"}), 400
+    if not isinstance(payments, list) or not payments:
+        return jsonify({"error": "payments must be a non-empty list"}), 400
+    if len(payments) > MAX_BATCH_PAYMENTS:
+        return jsonify({"error": f"At most {MAX_BATCH_PAYMENTS} payments per request"}), 400
+
+    # Sender and every receiver in one round trip
+    receivers = [p.get("receiver_account") if isinstance(p, dict) else None for p in payments]
+    wallets = Wallet.find_many_by_account_numbers([sender_account] + [r for r in receivers if r])
+    sender_data = wallets.get(sender_account)
+    if not sender_data:
+        return jsonify({"error": "Invalid sender account"}), 404
+    lookup_done = time.perf_counter()
+
+    # Items are checked in request order, so the same batch against the same
+    # balance always accepts and rejects the same payments
+    results = []
+    accepted = []
+    remaining = sender_data.get("balance", 0)
+    for index, payment in enumerate(payments):
+        receiver_account = receivers[index]
+        amount = payment.get("amount") if isinstance(payment, dict) else None
+        error = None
+        if not receiver_account or amount is None:
+            error = "Missing receiver or amount"
+        elif isinstance(amount, bool) or not isinstance(amount, (int, float)) or amount <= 0:
+            error = "Amount must be a positive number"
+        elif receiver_account == sender_account:
+            error = "Cannot transfer to the same account"
+        elif receiver_account not in wallets:
+            error = "Receiver wallet not found"
+        elif amount > remaining:
+            error = "Insufficient balance"
+
+        if error:
+            results.append({"index": index, "receiver_account": receiver_account, "status": "rejected", "error": error})
+            continue
+        remaining -= amount
+        accepted.append((index, payment, receiver_account, amount))
+
+    if not accepted:
+        return jsonify({"results": results, "accepted": 0, "rejected": len(results)}), 400
+
+    # Refuse before any money moves if the batch would not fit in the pool
+    bank_chain.mempool.check_admission(sender_account, count=len(accepted))
+
+    encrypted_pem = base64.b64decode(sender_data['encrypted_private_pin_key'])
+    salt_pin = base64.b64decode(sender_data['salt_pin'])
+    private_pin_key = unlock_private_pin_key(sender_account, encrypted_pem, pin, salt_pin)
 
-    return jsonify({"message": "Transaction created, balances updated.", "txn_id": tx.txn_id, "time": tx.timestamp}), 201
+    sender_name = f"{sender_data.get('first_name', 'Unknown')} {sender_data.get('last_name', '')}".strip()
+    tx_amounts = []
+    for _, payment, receiver_account, amount in accepted:
+        receiver_data = wallets[receiver_account]
+        receiver_name = f"{receiver_data.get('first_name', 'Unknown')} {receiver_data.get('last_name', '')}".strip()
+        tx = Transaction(sender_account, receiver_account, sender_name, receiver_name, amount, payment.get("note"), None,
+                         pin_key_version=sender_data.get("pin_key_version", 0))
+        tx_amounts.append((tx, amount))
+    # Unlock once, then sign the whole batch on the crypto pool
+    signatures = sign_messages(private_pin_key, [tx.tx_hash.encode() for tx, _ in tx_amounts])
+    for (tx, _), signature in zip(tx_amounts, signatures):
+        tx.signature = signature
+    sign_done = time.perf_counter()
+
+    try:
+        timings = execute_batch(sender_account, tx_amounts)
+    except InsufficientFundsError:
+        return jsonify({"error": "Insufficient balance"}), 400
+    except AccountNotFoundError:
+        return jsonify({"error": "Receiver wallet not found"}), 404
+
+    # The batch is mined together as its own block
+    block_producer.submit_block([tx for tx, _ in tx_amounts])
+
+    for (index, _, receiver_account, _), (tx, _) in zip(accepted, tx_amounts):
+        results.append({"index": index, "receiver_account": receiver_account, "status": "accepted", "txn_id": tx.txn_id})
+    results.sort(key=lambda r: r["index"])
+
+    timings = {
+        "lookup_ms": round((lookup_done - started) * 1000, 3),
+        "sign_ms": round((sign_done - lookup_done) * 1000, 3),
+        **timings,
+        "total_ms": round((time.perf_counter() - started) * 1000, 3)
+    }
+
+    return jsonify({
+        "message": "Batch created, balances updated.",
+        "results": results,
+        "accepted": len(accepted),
+        "rejected": len(results) - len(accepted),
+        "total_debited": sum(amount for _, amount in tx_amounts),
+        "status": "pending",
+        "timings": timings
+    }), 201
 
 
 @blockchain_bp.route("/credit", methods=["POST", "OPTIONS"])
@@ -75,6 +221,7 @@ def create_transaction():
     origins=["http://localhost:3000", "https://depayment.vercel.app"],
     supports_credentials=True
 )
+@idempotent("credit")
 def credit_account():
     data = request.get_json()
     account_number = data.get("account_number")
@@ -85,26 +232,30 @@ def credit_account():
     if not all([account_number, amount, password]):
         return jsonify({"error": "Account number, amount, and password are required"}), 400
 
-    wallet_data = Wallet.find_by_account_number(account_number)
+    if isinstance(amount, bool) or not isinstance(amount, (int, float)) or amount <= 0:
+        return jsonify({"error": "Amount must be a positive number"}), 400
+
+    wallet_data = Wallet.find_with_keys(account_number)
     if not wallet_data:
         return jsonify({"error": "Wallet not found"}), 404
 
     encrypted_pem = base64.b64decode(wallet_data['encrypted_private_key'])
     salt = base64.b64decode(wallet_data['salt'])
-    private_key = decrypt_private_key(encrypted_pem, password, salt)
+    private_key = unlock_private_key(account_number, encrypted_pem, password, salt)
+
+    receiver_name = f"{wallet_data.get('first_name', 'Unknown')} {wallet_data.get('last_name', '')}".strip()
 
     # Create a transaction where system (admin) credits user
-    tx = Transaction("system", account_number, amount, note, private_key)
-    tx.save_to_db()
+    tx = Transaction("system", account_number, "System", receiver_name, amount, note, private_key)
+    bank_chain.mempool.check_admission("system")
 
-    # Update balance
-    Wallet.update_balance(account_number, amount)
+    # Update balance and record the transaction together
+    execute_transfer(tx, amount)
 
-    # Add transaction to blockchain and mine
-    bank_chain.add_transaction(tx)
-    bank_chain.mine_pending_transactions("system")
+    # Queue transaction for the next mined block
+    block_producer.submit(tx)
 
-    return jsonify({"message": "Amount credited successfully", "transaction_hash": tx.tx_hash}), 201
+    return jsonify({"message": "Amount credited successfully", "transaction_hash": tx.tx_hash, "txn_id": tx.txn_id, "status": "pending"}), 201
 
 
 @blockchain_bp.route("/debit", methods=["POST", "OPTIONS"])
@@ -112,9 +263,10 @@ def credit_account():
     origins=["http://localhost:3000", "https://depayment.vercel.app"],
     supports_credentials=True
 )
+@require_auth
+@idempotent("debit")
 def debit_account():
-    token = request.headers.get("Authorization").split(" ")[1]
-    decoded = decode_token(token)
+    decoded = g.claims
     data = request.get_json()
     account_number = decoded["account_number"]
     amount = data.get("amount")
@@ -124,7 +276,10 @@ def debit_account():
     if not all([amount, password]):
         return jsonify({"error": "Amount and password are required"}), 400
 
-    wallet_data = Wallet.find_by_account_number(account_number)
+    if isinstance(amount, bool) or not isinstance(amount, (int, float)) or amount <= 0:
+        return jsonify({"error": "Amount must be a positive number"}), 400
+
+    wallet_data = Wallet.find_with_keys(account_number)
     if not wallet_data:
         return jsonify({"error": "Wallet not found"}), 404
 
@@ -134,20 +289,98 @@ def debit_account():
 
     encrypted_pem = base64.b64decode(wallet_data['encrypted_private_key'])
     salt = base64.b64decode(wallet_data['salt'])
-    private_key = decrypt_private_key(encrypted_pem, password, salt)
+    private_key = unlock_private_key(account_number, encrypted_pem, password, salt)
+
+    sender_name = f"{wallet_data.get('first_name', 'Unknown')} {wallet_data.get('last_name', '')}".strip()
 
     # Create transaction where user sends to system (admin)
-    tx = Transaction(account_number, "system", amount, note, private_key)
-    tx.save_to_db()
+    tx = Transaction(account_number, "system", sender_name, "System", amount, note, private_key)
+    bank_chain.mempool.check_admission(account_number)
+
+    # Debit only if the balance still covers it, and record the transaction together
+    try:
+        execute_transfer(tx, amount)
+    except InsufficientFundsError:
+        return jsonify({"error": "Insufficient balance"}), 400
 
-    # Update balance
-    Wallet.update_balance(account_number, -amount)
+    # Queue transaction for the next mined block
+    block_producer.submit(tx)
 
-    # Add transaction to blockchain and mine
-    bank_chain.add_transaction(tx)
-    bank_chain.mine_pending_transactions(account_number)
+    return jsonify({"message": "Amount debited successfully", "transaction_hash": tx.tx_hash, "txn_id": tx.txn_id, "status": "pending"}), 201
 
-    return jsonify({"message": "Amount debited successfully", "transaction_hash": tx.tx_hash}), 201
+
+@blockchain_bp.route("/status", methods=["GET", "OPTIONS"])
+@cross_origin(
+    origins=["http://localhost:3000", "https://depayment.vercel.app"],
+    supports_credentials=True
+)
+@require_auth
+def transaction_status():
+    decoded = g.claims
+    account_number = decoded["account_number"]
+
+    txn_id = request.args.get("txnId")
+    if not txn_id:
+        return jsonify({"error": "txnId is required"}), 400
+
+    tx = Transaction.find_by_txn_id(txn_id)
+    if not tx or account_number not in (tx["sender"]["account"], tx["receiver"]["account"]):
+        return jsonify({"error": "Transaction not found"}), 404
+
+    return jsonify({
+        "txn_id": txn_id,
+        "status": tx.get("status", "confirmed"),
+        "block_hash": tx.get("block_hash"),
+        "confirmed_at": tx.get("confirmed_at")
+    }), 200
+
+
+@blockchain_bp.route("/proof", methods=["GET", "OPTIONS"])
+@cross_origin(
+    origins=["http://localhost:3000", "https://depayment.vercel.app"],
+    supports_credentials=True
+)
+def transaction_proof():
+    txn_id = request.args.get("txnId")
+    if not txn_id:
+        return jsonify({"error": "txnId is required"}), 400
+
+    tx = Transaction.find_by_txn_id(txn_id)
+    if not tx:
+        return jsonify({"error": "Transaction not found"}), 404
+
+    if not tx.get("block_hash"):
+        return jsonify({"error": "Transaction is not in a block yet", "status": tx.get("status", "pending")}), 409
+
+    proof = bank_chain.inclusion_proof(tx["block_hash"], tx["tx_hash"])
+    if not proof:
+        return jsonify({"error": "No inclusion proof available for this transaction"}), 404
+
+    return jsonify({"txn_id": txn_id, "tx_hash": tx["tx_hash"], **proof}), 200
+
+
+@blockchain_bp.route("/verify-signatures", methods=["POST", "OPTIONS"])
+@cross_origin(
+    origins=["http://localhost:3000", "https://depayment.vercel.app"],
+    supports_credentials=True
+)
+@require_auth
+def bulk_verify_signatures():
+    txn_ids = request.get_json().get("txnIds")
+    if not isinstance(txn_ids, list) or not txn_ids:
+        return jsonify({"error": "txnIds must be a non-empty list"}), 400
+    if len(txn_ids) > MAX_BULK_VERIFY:
+        return jsonify({"error": f"At most {MAX_BULK_VERIFY} transactions per request"}), 400
+
+    txs = Transaction.find_by_txn_ids(txn_ids)
+    results = dict(zip([tx["txn_id"] for tx in txs], signature_verifier.verify_transactions(txs)))
+
+    return jsonify({
+        "results": [
+            {"txn_id": txn_id, "found": txn_id in results, "valid": results.get(txn_id, False)}
+            for txn_id in txn_ids
+        ]
+    }), 200
 
 
 @blockchain_bp.route("/balance", methods=["GET", "OPTIONS"])
@@ -155,17 +388,24 @@ def debit_account():
     origins=["http://localhost:3000", "https://depayment.vercel.app"],
     supports_credentials=True
 )
+@require_auth
 def view_balance():
-    token = request.headers.get("Authorization").split(" ")[1]
-    decoded = decode_token(token)
+    decoded = g.claims
 
     account_number = decoded["account_number"]
-    wallet_data = Wallet.find_by_account_number(account_number)
+    balance = Wallet.find_balance(account_number)
 
-    if not wallet_data:
+    if balance is None:
         return jsonify({"error": "Wallet not found"}), 404
 
-    return jsonify({"balance": wallet_data.get("balance", 0)}), 200
+    # ?height=N rebuilds the balance as of block N from the ledger
+    height = request.args.get("height")
+    if height is not None:
+        if not height.isdigit():
+            return jsonify({"error": "height must be a non-negative integer"}), 400
+        return jsonify({"balance": Ledger.balance_at(account_number, int(height)), "height": int(height)}), 200
+
+    return jsonify({"balance": balance}), 200
 
 
 @blockchain_bp.route("/history", methods=["GET", "OPTIONS"])
@@ -173,28 +413,66 @@ def view_balance():
     origins=["http://localhost:3000", "https://depayment.vercel.app"],
     supports_credentials=True
 )
+@require_auth
 def get_transaction_history():
-    token = request.headers.get("Authorization").split(" ")[1]
-    decoded = decode_token(token)
+    decoded = g.claims
     account_number = decoded["account_number"]
 
-    # Find all transactions where this user is sender or receiver
-    txs = transactions_collection.find({
-        "$or": [
-            {"sender_account": account_number},
-            {"receiver_account": account_number}
-        ]
-    }).sort("timestamp", -1)  # Newest first
-
-    history = []
-    for tx in txs:
-        history.append({
-            "sender": tx["sender_account"],
-            "receiver": tx["receiver_account"],
-            "amount": tx["amount"],
-            "note": tx.get("note", ""),
-            "timestamp": tx["timestamp"],
-            "tx_hash": tx["tx_hash"]
-        })
-
-    return jsonify({"history": history}), 200
\ No newline at end of file
+    try:
+        limit = min(int(request.args.get("limit", DEFAULT_HISTORY_PAGE)), MAX_HISTORY_PAGE)
+        start = parse_date(request.args.get("from"))
+        end = parse_date(request.args.get("to"))
+    except ValueError:
+        return jsonify({"error": "limit must be a number and from/to ISO dates"}), 400
+    if limit <= 0:
+        return jsonify({"error": "limit must be positive"}), 400
+
+    cursor = request.args.get("cursor")
+    try:
+        before = decode_cursor(cursor) if cursor else None
+    except InvalidCursorError:
+        return jsonify({"error": "Invalid cursor"}), 400
+
+    history, has_more = Transaction.find_page(
+        account_number, limit, before=before, start=start, end=end,
+        counterparty=request.args.get("counterparty")
+    )
+
+    next_cursor = None
+    if has_more:
+        last = history[-1]
+        next_cursor = encode_cursor(last["timestamp"], last["_id"])
+
+    return jsonify({"history": history, "next_cursor": next_cursor}), 200
+
+
+def _is_admin():
+    admin_token = os.getenv("ADMIN_TOKEN")
+    return bool(admin_token) and hmac.compare_digest(request.headers.get("X-Admin-Token", ""), admin_token)
+
+
+@blockchain_bp.route("/validate", methods=["POST"])
+def validate_chain():
+    if not _is_admin():
+        return jsonify({"error": "Forbidden"}), 403
+
+    full = request.args.get("full") == "true"
+    report = ChainValidator().run(full=full)
+    return jsonify(report), 200 if report["valid"] else 409
+
+
+@blockchain_bp.route("/reconcile", methods=["POST"])
+def reconcile_balances():
+    if not _is_admin():
+        return jsonify({"error": "Forbidden"}), 403
+
+    report = Ledger.reconcile()
+    return jsonify(report), 200 if not report["mismatched"] else 409
+
+
+@blockchain_bp.route("/pool-stats", methods=["GET"])
+def connection_pool_stats():
+    if not _is_admin():
+        return jsonify({"error": "Forbidden"}), 403
+
+    return jsonify(pool_metrics.snapshot()), 200
@@ -0,0 +1,67 @@
+# serve.py
+"""Production launcher.
+
+SERVE_MODE=wsgi (default) runs the Flask app under gunicorn with threaded
+workers; SERVE_MODE=asgi runs asgi.py under uvicorn, where the read
+endpoints are served on the event loop.
+"""
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SERVE_MODE = os.getenv("SERVE_MODE", "wsgi")
+BIND_HOST = os.getenv("BIND_HOST", "0.0.0.0")
+BIND_PORT = int(os.getenv("BIND_PORT", os.getenv("PORT", 5000)))
+# Every worker runs its own block producer, key pool and crypto executor,
+# so scale with cores rather than the usual 2 * cores + 1. Workers share one
+# environment and lease their own id shard from MongoDB; don't set ID_SHARD here.
+WEB_WORKERS = int(os.getenv("WEB_WORKERS", os.cpu_count() or 1))
+WEB_THREADS = int(os.getenv("WEB_THREADS", 16))
+WEB_BACKLOG = int(os.getenv("WEB_BACKLOG", 2048))
+WEB_KEEPALIVE = int(os.getenv("WEB_KEEPALIVE", 5))
+WEB_TIMEOUT = int(os.getenv("WEB_TIMEOUT", 60))
+# Requests accepted per ASGI worker before answering 503; 0 means unlimited
+WEB_MAX_CONCURRENCY = int(os.getenv("WEB_MAX_CONCURRENCY", 0))
+
+
+def serve_wsgi():
+    from gunicorn.app.base import BaseApplication
+
+    class GunicornApp(BaseApplication):
+        def load_config(self):
+            self.cfg.set("bind", f"{BIND_HOST}:{BIND_PORT}")
+            self.cfg.set("workers", WEB_WORKERS)
+            self.cfg.set("worker_class", "gthread")
+            self.cfg.set("threads", WEB_THREADS)
+            self.cfg.set("backlog", WEB_BACKLOG)
+            self.cfg.set("keepalive", WEB_KEEPALIVE)
+            self.cfg.set("timeout", WEB_TIMEOUT)
+
+        def load(self):
+            from app import app
+            return app
+
+    GunicornApp().run()
+
+
+def serve_asgi():
+    import uvicorn
+
+    uvicorn.run(
+        "asgi:application",
+        host=BIND_HOST,
+        port=BIND_PORT,
+        workers=WEB_WORKERS,
+        backlog=WEB_BACKLOG,
+        timeout_keep_alive=WEB_KEEPALIVE,
+        limit_concurrency=WEB_MAX_CONCURRENCY or None,
+        lifespan="on"
+    )
+
+
+if __name__ == "__main__":
+    if SERVE_MODE == "asgi":
+        serve_asgi()
+    else:
+        serve_wsgi()
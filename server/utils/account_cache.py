@@ -0,0 +1,179 @@
+#utils/account_cache.py
+import os
+import threading
+import time
+from collections import OrderedDict
+from bson import json_util
+from dotenv import load_dotenv
+
+load_dotenv()
+
+ACCOUNT_CACHE_BACKEND = os.getenv("ACCOUNT_CACHE_BACKEND", "memory")
+ACCOUNT_CACHE_URL = os.getenv("ACCOUNT_CACHE_URL", "redis://localhost:6379/0")
+ACCOUNT_CACHE_TTL = int(os.getenv("ACCOUNT_CACHE_TTL", 30))
+ACCOUNT_CACHE_MAX_ENTRIES = int(os.getenv("ACCOUNT_CACHE_MAX_ENTRIES", 50000))
+
+
+class InProcessBackend:
+    """LRU with per-entry TTL, private to this process."""
+
+    def __init__(self, max_entries=ACCOUNT_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+
+class RedisBackend:
+    """Shared cache for multi-worker deployments.
+
+    Takes any client with redis-py's get/set(ex=)/delete, so a local
+    stand-in such as fakeredis can replace a real server.
+    """
+
+    def __init__(self, client=None, url=ACCOUNT_CACHE_URL, prefix="acct-cache:"):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        # json_util keeps ObjectId and datetime values intact
+        return json_util.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, json_util.dumps(value), ex=ttl)
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*[self.prefix + key for key in keys])
+
+
+class NullBackend:
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl):
+        pass
+
+    def delete(self, *keys):
+        pass
+
+
+class AccountCache:
+    """Read-through cache of wallet profiles by account number and email.
+
+    Callers decide what is stored; the wallet model keeps key material and
+    the balance out. A load that races an invalidate() of the same account
+    is returned but not cached, so the stale copy cannot outlive the write.
+    Invalidations from other processes only reach the redis backend; with
+    the per-process one, entries elsewhere age out after the TTL.
+    """
+
+    GENERATION_STRIPES = 1024
+
+    def __init__(self, backend, ttl=ACCOUNT_CACHE_TTL):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+        # Bumped by invalidate(); striped so the table stays fixed in size
+        self._generations = [0] * self.GENERATION_STRIPES
+        self._lock = threading.Lock()
+
+    def _stripe(self, account_number):
+        return hash(account_number) % self.GENERATION_STRIPES
+
+    def _set_if_current(self, account_number, generation, entries):
+        with self._lock:
+            if self._generations[self._stripe(account_number)] != generation:
+                self.skipped += 1
+                return
+            for key, value in entries:
+                self.backend.set(key, value, self.ttl)
+
+    def get_account(self, account_number, loader):
+        key = f"account:{account_number}"
+        doc = self.backend.get(key)
+        if doc is not None:
+            self.hits += 1
+            return dict(doc)
+        self.misses += 1
+        generation = self._generations[self._stripe(account_number)]
+        doc = loader(account_number)
+        # Misses are not cached so a new signup is visible immediately
+        if doc is not None:
+            self._set_if_current(account_number, generation, [(key, doc)])
+            return dict(doc)
+        return None
+
+    def get_by_email(self, email, loader):
+        # Email maps to an account number; the document itself lives under the account key
+        account_number = self.backend.get(f"email:{email}")
+        if account_number is not None:
+            doc = self.backend.get(f"account:{account_number}")
+            if doc is not None:
+                self.hits += 1
+                return dict(doc)
+        self.misses += 1
+        generations = list(self._generations)
+        doc = loader(email)
+        if doc is not None:
+            account_number = doc["account_number"]
+            self._set_if_current(account_number, generations[self._stripe(account_number)],
+                                 [(f"email:{email}", account_number), (f"account:{account_number}", doc)])
+            return dict(doc)
+        return None
+
+    def invalidate(self, *account_numbers):
+        with self._lock:
+            for n in account_numbers:
+                self._generations[self._stripe(n)] += 1
+        self.backend.delete(*[f"account:{n}" for n in account_numbers])
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "skipped_stale": self.skipped,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def _make_backend(name):
+    if name == "redis":
+        return RedisBackend()
+    if name == "none":
+        return NullBackend()
+    return InProcessBackend()
+
+
+account_cache = AccountCache(_make_backend(ACCOUNT_CACHE_BACKEND))
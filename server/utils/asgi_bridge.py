@@ -0,0 +1,130 @@
+#utils/asgi_bridge.py
+import asyncio
+import io
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Chunks buffered between the WSGI thread and the event loop before the thread waits
+BRIDGE_QUEUE_SIZE = 16
+
+
+class _Aborted(Exception):
+    pass
+
+
+def build_environ(scope, body):
+    server = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf8").decode("latin1"),
+        "PATH_INFO": scope["path"].encode("utf8").decode("latin1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    if scope.get("client"):
+        environ["REMOTE_ADDR"] = scope["client"][0]
+    for name, value in scope.get("headers", []):
+        name, value = name.decode("latin1"), value.decode("latin1")
+        if name == "content-length":
+            continue
+        if name == "content-type":
+            environ["CONTENT_TYPE"] = value
+            continue
+        key = "HTTP_" + name.upper().replace("-", "_")
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+class WsgiBridge:
+    """Serves a WSGI app from ASGI, one request per pool thread.
+
+    Unlike asgiref's WsgiToAsgi, requests are not funnelled through a single
+    thread, and response bodies are streamed back chunk by chunk with
+    backpressure instead of being buffered whole.
+    """
+
+    def __init__(self, wsgi_app, workers):
+        self.wsgi_app = wsgi_app
+        self.pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="wsgi")
+
+    def _run(self, environ, loop, queue, aborted):
+        def put(item):
+            if aborted.is_set():
+                raise _Aborted()
+            asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+
+        def start_response(status, headers, exc_info=None):
+            put(("start", (int(status.split(" ", 1)[0]),
+                           [(k.lower().encode("latin1"), v.encode("latin1")) for k, v in headers])))
+            return lambda data: put(("body", data))
+
+        try:
+            result = self.wsgi_app(environ, start_response)
+            try:
+                for chunk in result:
+                    if chunk:
+                        put(("body", chunk))
+            finally:
+                if hasattr(result, "close"):
+                    result.close()
+            put(("end", None))
+        except _Aborted:
+            pass
+        except BaseException as e:
+            if not aborted.is_set():
+                asyncio.run_coroutine_threadsafe(queue.put(("error", e)), loop).result()
+
+    async def __call__(self, scope, receive, send):
+        body = bytearray()
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            body.extend(message.get("body", b""))
+            if not message.get("more_body"):
+                break
+
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=BRIDGE_QUEUE_SIZE)
+        aborted = threading.Event()
+        future = loop.run_in_executor(self.pool, self._run, build_environ(scope, bytes(body)), loop, queue, aborted)
+        started = False
+        try:
+            while True:
+                kind, value = await queue.get()
+                if kind == "start":
+                    await send({"type": "http.response.start", "status": value[0], "headers": value[1]})
+                    started = True
+                elif kind == "body":
+                    await send({"type": "http.response.body", "body": bytes(value), "more_body": True})
+                elif kind == "error":
+                    if not started:
+                        await send({"type": "http.response.start", "status": 500,
+                                    "headers": [(b"content-type", b"text/plain")]})
+                    await send({"type": "http.response.body", "body": b"Internal Server Error" if not started else b""})
+                    raise value
+                else:
+                    await send({"type": "http.response.body", "body": b""})
+                    break
+        finally:
+            # Unblock the worker thread if we stopped reading early (e.g. client went away)
+            aborted.set()
+            while not future.done():
+                try:
+                    queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    await asyncio.sleep(0.01)
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False)
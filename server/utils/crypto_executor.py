@@ -0,0 +1,156 @@
+#utils/crypto_executor.py
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dotenv import load_dotenv
+from utils.metrics import observe_crypto, registry, family
+
+load_dotenv()
+
+# "process" runs heavy crypto in worker processes, "thread" in a thread pool
+# (OpenSSL and bcrypt release the GIL), "inline" keeps it on the request thread.
+CRYPTO_EXECUTOR = os.getenv("CRYPTO_EXECUTOR", "process")
+CRYPTO_WORKERS = int(os.getenv("CRYPTO_WORKERS", os.cpu_count() or 1))
+CRYPTO_MAX_PENDING = int(os.getenv("CRYPTO_MAX_PENDING", 64))
+CRYPTO_QUEUE_TIMEOUT = float(os.getenv("CRYPTO_QUEUE_TIMEOUT", 5))
+
+
+class CryptoBusyError(RuntimeError):
+    """Raised when the crypto queue stays full for longer than the queue timeout."""
+
+
+class CryptoExecutor:
+    def __init__(self, mode=CRYPTO_EXECUTOR, workers=CRYPTO_WORKERS, max_pending=CRYPTO_MAX_PENDING,
+                 queue_timeout=CRYPTO_QUEUE_TIMEOUT):
+        if mode not in ("process", "thread", "inline"):
+            raise ValueError(f"Unknown crypto executor mode: {mode}")
+        self.mode = mode if workers > 0 else "inline"
+        self.workers = workers
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._pool = None
+        self._thread_pool = None
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def _get_pool(self, picklable):
+        with self._lock:
+            if self.mode == "process" and picklable:
+                if self._pool is None:
+                    self._pool = ProcessPoolExecutor(max_workers=self.workers)
+                return self._pool
+            if self._thread_pool is None:
+                self._thread_pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="crypto")
+            return self._thread_pool
+
+    def run(self, op, fn, *args, picklable=True):
+        """Run fn(*args) on the crypto pool and block until it returns.
+
+        Callers whose arguments cannot cross a process boundary (live key
+        objects) pass picklable=False and are served by the thread pool.
+        """
+        queued_at = time.perf_counter()
+        if self.mode == "inline":
+            result = fn(*args)
+            self._record(op, 0.0, time.perf_counter() - queued_at)
+            return result
+
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            self._record_rejected(op)
+            raise CryptoBusyError(f"Crypto queue full, rejected {op}")
+        try:
+            future = self._get_pool(picklable).submit(_timed_call, fn, args)
+            result, run_time = future.result()
+        finally:
+            self._slots.release()
+        # perf_counter is not comparable across processes, so queue wait is total minus run time
+        total = time.perf_counter() - queued_at
+        self._record(op, max(0.0, total - run_time), run_time)
+        return result
+
+    def map(self, op, fn, arg_tuples, picklable=True):
+        """Run fn over many argument tuples concurrently; results keep input order."""
+        arg_tuples = list(arg_tuples)
+        if self.mode == "inline":
+            return [self.run(op, fn, *args) for args in arg_tuples]
+
+        queued_at = time.perf_counter()
+        pool = self._get_pool(picklable)
+        futures = []
+        try:
+            for args in arg_tuples:
+                if not self._slots.acquire(timeout=self.queue_timeout):
+                    self._record_rejected(op)
+                    raise CryptoBusyError(f"Crypto queue full, rejected {op}")
+                future = pool.submit(_timed_call, fn, args)
+                future.add_done_callback(lambda _: self._slots.release())
+                futures.append(future)
+        except CryptoBusyError:
+            for future in futures:
+                future.cancel()
+            raise
+
+        results = []
+        for future in futures:
+            result, run_time = future.result()
+            self._record(op, max(0.0, time.perf_counter() - queued_at - run_time), run_time)
+            results.append(result)
+        return results
+
+    def _record(self, op, wait, run):
+        with self._lock:
+            s = self._stats.setdefault(op, {"count": 0, "rejected": 0, "wait_total": 0.0, "run_total": 0.0, "run_max": 0.0})
+            s["count"] += 1
+            s["wait_total"] += wait
+            s["run_total"] += run
+            s["run_max"] = max(s["run_max"], run)
+        observe_crypto(op, wait, run)
+
+    def _record_rejected(self, op):
+        with self._lock:
+            s = self._stats.setdefault(op, {"count": 0, "rejected": 0, "wait_total": 0.0, "run_total": 0.0, "run_max": 0.0})
+            s["rejected"] += 1
+
+    def stats(self):
+        with self._lock:
+            ops = {}
+            for op, s in self._stats.items():
+                count = s["count"]
+                ops[op] = {
+                    "count": count,
+                    "rejected": s["rejected"],
+                    "avg_wait_ms": 1000 * s["wait_total"] / count if count else 0.0,
+                    "avg_run_ms": 1000 * s["run_total"] / count if count else 0.0,
+                    "max_run_ms": 1000 * s["run_max"],
+                }
+            return {"mode": self.mode, "workers": self.workers, "operations": ops}
+
+    def shutdown(self):
+        with self._lock:
+            for pool in (self._pool, self._thread_pool):
+                if pool is not None:
+                    pool.shutdown()
+            self._pool = None
+            self._thread_pool = None
+
+
+def _timed_call(fn, args):
+    started_at = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started_at
+
+
+crypto_executor = CryptoExecutor()
+
+
+def _crypto_executor_lines():
+    # Wait and run times are already histograms (crypto_operation_duration_seconds)
+    ops = crypto_executor.stats()["operations"]
+    return (family("crypto_operations_total", "counter", "Crypto operations completed",
+                   [({"op": op}, s["count"]) for op, s in sorted(ops.items())])
+            + family("crypto_rejected_total", "counter", "Crypto operations rejected because the queue was full",
+                     [({"op": op}, s["rejected"]) for op, s in sorted(ops.items())]))
+
+
+registry.add_collector(_crypto_executor_lines)
@@ -3,42 +3,72 @@ from cryptography.hazmat.primitives import hashes, serialization
 from cryptography.hazmat.primitives.asymmetric import rsa, padding
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 from cryptography.fernet import Fernet
+from utils.crypto_executor import crypto_executor
 import base64
 import os
 
-def generate_keys():
-    # Generate a unique private-public key pair every time
+# The public functions below are a synchronous facade over crypto_executor.
+# Key objects cannot be pickled, so work sent to a worker process goes in and
+# comes back as PEM bytes and is parsed on the calling side.
+
+def _generate_private_pem():
     private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
-    public_key = private_key.public_key()
-    return private_key, public_key
+    return private_key.private_bytes(encoding=serialization.Encoding.PEM,
+                                     format=serialization.PrivateFormat.PKCS8,
+                                     encryption_algorithm=serialization.NoEncryption())
 
-def serialize_private_key(private_key, password: str):
+def _encrypt_pem(pem: bytes, password: str):
     salt = os.urandom(16)  # Generate a new salt each time
     kdf = PBKDF2HMAC(algorithm=hashes.SHA256(), length=32, salt=salt, iterations=480000)
     key = base64.urlsafe_b64encode(kdf.derive(password.encode()))
     fernet = Fernet(key)
-    pem = private_key.private_bytes(encoding=serialization.Encoding.PEM, 
+    return fernet.encrypt(pem), salt
+
+def _decrypt_pem(encrypted_pem, password: str, salt):
+    kdf = PBKDF2HMAC(algorithm=hashes.SHA256(), length=32, salt=salt, iterations=480000)
+    key = base64.urlsafe_b64encode(kdf.derive(password.encode()))  # Encoding the password
+    fernet = Fernet(key)
+    return fernet.decrypt(encrypted_pem)
+
+def _sign(private_key, message: bytes):
+    return private_key.sign(message, padding.PSS(mgf=padding.MGF1(hashes.SHA256()), salt_length=padding.PSS.MAX_LENGTH),
+                            hashes.SHA256())
+
+def generate_keys():
+    # Generate a unique private-public key pair every time
+    pem = crypto_executor.run("generate_keys", _generate_private_pem)
+    private_key = serialization.load_pem_private_key(pem, password=None)
+    public_key = private_key.public_key()
+    return private_key, public_key
+
+def serialize_private_key(private_key, password: str):
+    pem = private_key.private_bytes(encoding=serialization.Encoding.PEM,
                                     format=serialization.PrivateFormat.PKCS8,
                                     encryption_algorithm=serialization.NoEncryption())
-    encrypted_pem = fernet.encrypt(pem)
+    encrypted_pem, salt = crypto_executor.run("serialize_private_key", _encrypt_pem, pem, password)
     return encrypted_pem, salt
 
 def decrypt_private_key(encrypted_pem, password: str, salt):
     if not password:
         raise ValueError("Password cannot be None")
 
-    kdf = PBKDF2HMAC(algorithm=hashes.SHA256(), length=32, salt=salt, iterations=480000)
-    key = base64.urlsafe_b64encode(kdf.derive(password.encode()))  # Encoding the password
-    fernet = Fernet(key)
-    decrypted_pem = fernet.decrypt(encrypted_pem)
+    decrypted_pem = crypto_executor.run("decrypt_private_key", _decrypt_pem, encrypted_pem, password, salt)
     private_key = serialization.load_pem_private_key(decrypted_pem, password=None)
     return private_key
 
 def sign_message(private_key, message: bytes):
-    signature = private_key.sign(message, padding.PSS(mgf=padding.MGF1(hashes.SHA256()), salt_length=padding.PSS.MAX_LENGTH),
-                                 hashes.SHA256())
+    signature = crypto_executor.run("sign_message", _sign, private_key, message, picklable=False)
     return signature
 
+def sign_messages(private_key, messages):
+    # Fans out over the crypto pool; signatures come back in message order
+    return crypto_executor.map("sign_message", _sign, [(private_key, m) for m in messages], picklable=False)
+
+def load_public_key(stored_pem: str):
+    # Wallets store the PEM body with its BEGIN/END lines stripped
+    pem = f"-----BEGIN PUBLIC KEY-----\n{stored_pem}\n-----END PUBLIC KEY-----\n"
+    return serialization.load_pem_public_key(pem.encode())
+
 def verify_signature(public_key, message: bytes, signature):
     public_key.verify(signature, message,
                       padding.PSS(mgf=padding.MGF1(hashes.SHA256()), salt_length=padding.PSS.MAX_LENGTH),
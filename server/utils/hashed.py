@@ -1,10 +1,16 @@
 import bcrypt
+from utils.crypto_executor import crypto_executor
+
+def _hashpw(pin: str) -> str:
+    return bcrypt.hashpw(pin.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+
+def _checkpw(pin: str, hashed_pin: str) -> bool:
+    return bcrypt.checkpw(pin.encode('utf-8'), hashed_pin.encode('utf-8'))
 
 def hash_pin(pin: str) -> str:
     """Hash a 4-digit PIN using bcrypt."""
-    hashed = bcrypt.hashpw(pin.encode('utf-8'), bcrypt.gensalt())
-    return hashed.decode('utf-8')
+    return crypto_executor.run("hash_pin", _hashpw, pin)
 
 def verify_pin(pin: str, hashed_pin: str) -> bool:
     """Verify a plain PIN against its hashed version."""
-    return bcrypt.checkpw(pin.encode('utf-8'), hashed_pin.encode('utf-8'))
+    return crypto_executor.run("verify_pin", _checkpw, pin, hashed_pin)
@@ -0,0 +1,183 @@
+#utils/id_generator.py
+import atexit
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pymongo.errors import DuplicateKeyError, PyMongoError
+from dotenv import load_dotenv
+from db import id_shards_collection
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Unique to this process, including across restarts and hosts
+PROCESS_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+# Names the process that owns a pending transaction. Never configured: two
+# processes sharing one would both mine the same journal.
+NODE_ID = PROCESS_ID
+# Pins this process to one shard; by default a free one is leased from MongoDB
+ID_SHARD = int(os.environ["ID_SHARD"]) if os.getenv("ID_SHARD") else None
+# Account numbers have room for the fewest shards, so that bounds both generators
+ID_SHARD_COUNT = 100
+ID_SHARD_LEASE_SECONDS = int(os.getenv("ID_SHARD_LEASE_SECONDS", 60))
+ID_EPOCH = datetime(2025, 1, 1, tzinfo=timezone.utc).timestamp()
+
+ACCOUNT_NUMBER_BASE = 100000000000
+ACCOUNT_NUMBER_MAX = 999999999999
+TXN_ID_PREFIX = "TXN"
+TXN_ID_WIDTH = 13
+BASE36 = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+
+class SnowflakeGenerator:
+    """Packs (tick, shard, sequence) into an integer that only ever increases.
+
+    When a tick's sequence runs out, or the clock steps backwards, the
+    generator borrows the next tick instead of waiting, so ids stay unique
+    and ordered and drift only slightly ahead of the wall clock.
+    """
+
+    def __init__(self, shard, shard_count, sequence_size, tick_seconds, epoch=ID_EPOCH):
+        self.shard = shard % shard_count
+        self.shard_count = shard_count
+        self.sequence_size = sequence_size
+        self.tick_seconds = tick_seconds
+        self.epoch = epoch
+        self._last_tick = -1
+        self._sequence = 0
+        self._lock = threading.Lock()
+
+    def next_id(self):
+        with self._lock:
+            tick = int((time.time() - self.epoch) / self.tick_seconds)
+            if tick > self._last_tick:
+                self._last_tick = tick
+                self._sequence = 0
+            elif self._sequence + 1 < self.sequence_size:
+                self._sequence += 1
+            else:
+                self._last_tick += 1
+                self._sequence = 0
+            return (self._last_tick * self.shard_count + self.shard) * self.sequence_size + self._sequence
+
+
+class ShardLease:
+    """Reserves an id shard in MongoDB so no two live processes share one.
+
+    A daemon thread renews the lease; a crashed process's shard is free
+    again once its lease lapses. A pinned shard is registered the same way,
+    and acquiring it fails while another live process holds it.
+    """
+
+    def __init__(self, collection, owner, shard_count=ID_SHARD_COUNT, ttl=ID_SHARD_LEASE_SECONDS):
+        self.collection = collection
+        self.owner = owner
+        self.shard_count = shard_count
+        self.ttl = ttl
+        self.shard = None
+        self.on_change = None
+        self._thread = None
+
+    def _claim(self, shard):
+        now = datetime.now(timezone.utc)
+        lease = {"owner": self.owner, "expires_at": now + timedelta(seconds=self.ttl)}
+        try:
+            self.collection.insert_one({"_id": shard, **lease})
+            return True
+        except DuplicateKeyError:
+            result = self.collection.update_one(
+                {"_id": shard, "$or": [{"expires_at": {"$lt": now}}, {"owner": self.owner}]}, {"$set": lease})
+            return result.matched_count == 1
+
+    def acquire(self, shard=None):
+        if shard is not None and not 0 <= shard < self.shard_count:
+            raise ValueError(f"ID_SHARD must be between 0 and {self.shard_count - 1}")
+        for candidate in [shard] if shard is not None else range(self.shard_count):
+            if self._claim(candidate):
+                self.shard = candidate
+                self._start()
+                return candidate
+        if shard is not None:
+            raise RuntimeError(f"ID shard {shard} is leased by another live process")
+        raise RuntimeError(f"All {self.shard_count} ID shards are leased")
+
+    def renew(self):
+        result = self.collection.update_one(
+            {"_id": self.shard, "owner": self.owner},
+            {"$set": {"expires_at": datetime.now(timezone.utc) + timedelta(seconds=self.ttl)}})
+        return result.matched_count == 1
+
+    def release(self):
+        if self.shard is not None:
+            self.collection.delete_one({"_id": self.shard, "owner": self.owner})
+
+    def _start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="id-shard-lease", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.ttl / 3)
+            try:
+                if self.renew():
+                    continue
+                # Stalled past the lease and someone else took the shard: move to a free one
+                logger.error("Lost the lease on ID shard %s, acquiring another", self.shard)
+                shard = self.acquire(ID_SHARD)
+                if self.on_change:
+                    self.on_change(shard)
+            except (PyMongoError, RuntimeError):
+                logger.exception("Could not renew the ID shard lease")
+
+
+# Accounts: seconds * 1000 + shard (2 digits) * 10 + sequence (1 digit),
+# which fits 12 digits until about 2053
+account_ids = SnowflakeGenerator(0, shard_count=ID_SHARD_COUNT, sequence_size=10, tick_seconds=1)
+# Transactions: 41 bits of milliseconds, 10 bits of shard, 12 bits of sequence
+txn_ids = SnowflakeGenerator(0, shard_count=1024, sequence_size=4096, tick_seconds=0.001)
+
+shard_lease = ShardLease(id_shards_collection, PROCESS_ID)
+_shard_lock = threading.Lock()
+
+
+def _use_shard(shard):
+    account_ids.shard = shard
+    txn_ids.shard = shard
+
+
+def _ensure_shard():
+    # Leased on first use, so tools that never mint ids don't hold a shard
+    if shard_lease.shard is None:
+        with _shard_lock:
+            if shard_lease.shard is None:
+                shard_lease.on_change = _use_shard
+                _use_shard(shard_lease.acquire(ID_SHARD))
+                atexit.register(shard_lease.release)
+
+
+def new_account_number():
+    _ensure_shard()
+    account_number = ACCOUNT_NUMBER_BASE + account_ids.next_id()
+    if account_number > ACCOUNT_NUMBER_MAX:
+        raise OverflowError("Account number space exhausted")
+    return str(account_number)
+
+
+def _base36(value, width):
+    digits = []
+    while value:
+        value, digit = divmod(value, 36)
+        digits.append(BASE36[digit])
+    return "".join(reversed(digits)).rjust(width, "0")
+
+
+def new_txn_id():
+    _ensure_shard()
+    # Fixed width keeps string order equal to numeric (time) order
+    return TXN_ID_PREFIX + _base36(txn_ids.next_id(), TXN_ID_WIDTH)
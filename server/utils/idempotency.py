@@ -0,0 +1,207 @@
+#utils/idempotency.py
+import hashlib
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from functools import wraps
+from flask import request, jsonify, make_response, Response, g
+from pymongo.errors import DuplicateKeyError, PyMongoError
+from dotenv import load_dotenv
+from db import idempotency_collection
+from utils.account_cache import InProcessBackend
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL", 24 * 3600))
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", 10000))
+# How long a duplicate waits on the first execution, and after how long an
+# unfinished claim may be taken over. Running requests renew their claim
+# every third of that, so only a crashed or stuck worker's claim lapses.
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", 30))
+IDEMPOTENCY_LOCK_SECONDS = int(os.getenv("IDEMPOTENCY_LOCK_SECONDS", 60))
+MAX_KEY_LENGTH = 255
+
+
+class IdempotencyStore:
+    """Stored responses keyed by Idempotency-Key, with duplicates coalesced.
+
+    The collection is the source of truth across workers (a unique _id is
+    the claim, a TTL index expires it); completed responses are also kept
+    in an in-process LRU so replays skip the round trip. Each claim carries
+    a token: the result is only written by the holder of the current one,
+    so a claim taken over from a worker that stalled is not overwritten
+    when that worker comes back.
+    """
+
+    def __init__(self, collection=idempotency_collection, cache=None, ttl=IDEMPOTENCY_TTL,
+                 lock_seconds=IDEMPOTENCY_LOCK_SECONDS):
+        self.collection = collection
+        self.cache = cache or InProcessBackend(max_entries=IDEMPOTENCY_CACHE_SIZE)
+        self.ttl = ttl
+        self.lock_seconds = lock_seconds
+        self._inflight = {}
+        # key -> token of the claims this process holds, renewed by _renew_claims
+        self._claims = {}
+        self._renewer = None
+        self._lock = threading.Lock()
+        self.replays = 0
+        self.lost_claims = 0
+
+    def _completed(self, key):
+        record = self.cache.get(key)
+        if record is None:
+            doc = self.collection.find_one({"_id": key, "status": "completed"})
+            if doc:
+                record = {k: doc[k] for k in ("fingerprint", "status_code", "body", "mimetype")}
+                self.cache.set(key, record, self.ttl)
+        return record
+
+    def _claim(self, key, fingerprint):
+        """Return the claim's token, or None if another execution holds the key."""
+        now = datetime.utcnow()
+        token = uuid.uuid4().hex
+        try:
+            self.collection.insert_one({"_id": key, "fingerprint": fingerprint, "status": "in_progress",
+                                        "token": token, "created_at": now, "claimed_at": now})
+        except DuplicateKeyError:
+            # Take over a claim whose owner stopped renewing it
+            result = self.collection.update_one(
+                {"_id": key, "status": "in_progress",
+                 "claimed_at": {"$lt": now - timedelta(seconds=self.lock_seconds)}},
+                {"$set": {"fingerprint": fingerprint, "token": token, "claimed_at": now}}
+            )
+            if result.modified_count != 1:
+                return None
+        with self._lock:
+            self._claims[key] = token
+            if self._renewer is None:
+                self._renewer = threading.Thread(target=self._renew_claims, name="idempotency-renew", daemon=True)
+                self._renewer.start()
+        return token
+
+    def _renew_claims(self):
+        while True:
+            time.sleep(self.lock_seconds / 3)
+            with self._lock:
+                claims = list(self._claims.items())
+            for key, token in claims:
+                try:
+                    self.collection.update_one({"_id": key, "token": token, "status": "in_progress"},
+                                               {"$set": {"claimed_at": datetime.utcnow()}})
+                except PyMongoError:
+                    logger.exception("Renewing the idempotency claim on %s failed", key)
+
+    def _drop_claim(self, key):
+        with self._lock:
+            self._claims.pop(key, None)
+
+    def _complete(self, key, token, record):
+        self._drop_claim(key)
+        result = self.collection.update_one({"_id": key, "token": token},
+                                            {"$set": {"status": "completed", **record}})
+        if result.matched_count != 1:
+            # Taken over after our claim lapsed; the new owner's result stands
+            self.lost_claims += 1
+            logger.warning("Idempotency claim on %s was lost before its result was stored", key)
+            return
+        self.cache.set(key, record, self.ttl)
+
+    def _release(self, key, token):
+        self._drop_claim(key)
+        self.collection.delete_one({"_id": key, "token": token, "status": "in_progress"})
+
+    def _replay(self, record, fingerprint):
+        if record["fingerprint"] != fingerprint:
+            return jsonify({"error": "Idempotency-Key was already used with a different request"}), 422
+        self.replays += 1
+        response = Response(record["body"], status=record["status_code"], mimetype=record["mimetype"])
+        response.headers["Idempotent-Replayed"] = "true"
+        return response
+
+    def execute(self, key, fingerprint, handler):
+        record = self._completed(key)
+        if record is not None:
+            return self._replay(record, fingerprint)
+
+        with self._lock:
+            event = self._inflight.get(key)
+            leader = event is None
+            if leader:
+                event = self._inflight[key] = threading.Event()
+
+        if not leader:
+            # Same process: wait for the first execution and share its response
+            event.wait(IDEMPOTENCY_WAIT_SECONDS)
+            record = self._completed(key)
+            if record is not None:
+                return self._replay(record, fingerprint)
+            return jsonify({"error": "A request with this Idempotency-Key is still in progress"}), 409
+
+        try:
+            token = self._claim(key, fingerprint)
+            if token is None:
+                # Another worker holds or has finished the key
+                record = self._completed(key)
+                if record is not None:
+                    return self._replay(record, fingerprint)
+                return jsonify({"error": "A request with this Idempotency-Key is still in progress"}), 409
+
+            try:
+                response = make_response(handler())
+            except Exception:
+                self._release(key, token)
+                raise
+            # Server errors are not final; let the client retry them
+            if response.status_code >= 500:
+                self._release(key, token)
+            else:
+                self._complete(key, token, {"fingerprint": fingerprint, "status_code": response.status_code,
+                                     "body": response.get_data(as_text=True), "mimetype": response.mimetype})
+            return response
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            event.set()
+
+    def stats(self):
+        with self._lock:
+            inflight = len(self._inflight)
+        return {"inflight": inflight, "replays": self.replays, "lost_claims": self.lost_claims}
+
+
+idempotency_store = IdempotencyStore()
+
+
+def _owner():
+    # Keys are per account: the one require_auth verified, or the body's for /credit
+    if "account_number" in g:
+        return g.account_number
+    return (request.get_json(silent=True) or {}).get("account_number")
+
+
+def idempotent(scope):
+    """Make a POST route replay its stored response for a repeated Idempotency-Key."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = request.headers.get("Idempotency-Key")
+            if request.method != "POST" or not key:
+                return view(*args, **kwargs)
+            if len(key) > MAX_KEY_LENGTH:
+                return jsonify({"error": f"Idempotency-Key must be at most {MAX_KEY_LENGTH} characters"}), 400
+
+            owner = _owner()
+            if owner is None:
+                # Malformed request; the route reports the error
+                return view(*args, **kwargs)
+
+            fingerprint = hashlib.sha256(request.get_data()).hexdigest()
+            return idempotency_store.execute(f"{scope}:{owner}:{key}", fingerprint,
+                                             lambda: view(*args, **kwargs))
+        return wrapper
+    return decorator
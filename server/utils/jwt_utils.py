@@ -1,11 +1,22 @@
 #utils/jwt_utils.py
 import jwt
 import datetime
+import hashlib
 import os
+import threading
+import time
+from collections import OrderedDict
 from dotenv import load_dotenv
+from db import revoked_tokens_collection
 
 load_dotenv()
 JWT_SECRET = os.getenv("JWT_SECRET")
+CLAIMS_CACHE_SIZE = int(os.getenv("CLAIMS_CACHE_SIZE", 10000))
+# How often each worker pulls revocations made by the others
+REVOCATION_SYNC_SECONDS = float(os.getenv("REVOCATION_SYNC_SECONDS", 5))
+# Each sync re-reads this far behind the newest revoked_at it has seen, for
+# revocations stamped earlier but committed later than that one
+REVOCATION_SYNC_OVERLAP_SECONDS = float(os.getenv("REVOCATION_SYNC_OVERLAP_SECONDS", 60))
 
 def generate_token(account_number):
     payload = {
@@ -17,3 +28,129 @@ def generate_token(account_number):
 
 def decode_token(token):
     return jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
+
+def token_digest(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class ClaimsCache:
+    """Bounded LRU of verified claims keyed by token digest; entries die with the token's exp."""
+
+    def __init__(self, max_entries=CLAIMS_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._claims = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, digest):
+        with self._lock:
+            entry = self._claims.get(digest)
+            if entry is not None and entry[1] > time.time():
+                self._claims.move_to_end(digest)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._claims[digest]
+            self.misses += 1
+            return None
+
+    def put(self, digest, claims):
+        if "exp" not in claims:
+            return
+        with self._lock:
+            self._claims[digest] = (claims, claims["exp"])
+            self._claims.move_to_end(digest)
+            while len(self._claims) > self.max_entries:
+                self._claims.popitem(last=False)
+
+    def invalidate(self, digest):
+        with self._lock:
+            self._claims.pop(digest, None)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._claims), "hits": self.hits, "misses": self.misses}
+
+
+class RevocationList:
+    """Revoked token digests, shared through Mongo and mirrored in memory.
+
+    Each entry expires with the token it revokes (TTL index on expires_at),
+    so the list only ever holds tokens that would otherwise still verify.
+    """
+
+    def __init__(self, collection=revoked_tokens_collection, sync_seconds=REVOCATION_SYNC_SECONDS,
+                 overlap_seconds=REVOCATION_SYNC_OVERLAP_SECONDS):
+        self.collection = collection
+        self.sync_seconds = sync_seconds
+        self.overlap = datetime.timedelta(seconds=overlap_seconds)
+        self._revoked = {}
+        self._synced_at = 0.0
+        self._cursor = datetime.datetime.min
+        self._lock = threading.Lock()
+
+    def revoke(self, token):
+        claims = decode_token(token)
+        digest = token_digest(token)
+        expires_at = datetime.datetime.utcfromtimestamp(claims["exp"])
+        self.collection.update_one(
+            {"_id": digest},
+            # Stamped by the server so every worker's revocations share one clock
+            {"$set": {"expires_at": expires_at, "account_number": claims.get("account_number")},
+             "$currentDate": {"revoked_at": True}},
+            upsert=True
+        )
+        with self._lock:
+            self._revoked[digest] = claims["exp"]
+        return digest
+
+    def _sync(self):
+        now = time.time()
+        if now - self._synced_at < self.sync_seconds:
+            return
+        with self._lock:
+            if now - self._synced_at < self.sync_seconds:
+                return
+            self._synced_at = now
+            cursor = self._cursor
+        # Only pull what was revoked since the last sync, plus the overlap;
+        # entries read twice just overwrite themselves
+        newest = cursor
+        since = cursor - self.overlap if cursor > datetime.datetime.min + self.overlap else cursor
+        for doc in self.collection.find({"revoked_at": {"$gte": since}}, {"expires_at": 1, "revoked_at": 1}):
+            exp = doc["expires_at"].replace(tzinfo=datetime.timezone.utc).timestamp()
+            with self._lock:
+                self._revoked[doc["_id"]] = exp
+            newest = max(newest, doc["revoked_at"])
+        with self._lock:
+            self._cursor = newest
+            for digest in [d for d, exp in self._revoked.items() if exp <= now]:
+                del self._revoked[digest]
+
+    def is_revoked(self, digest):
+        self._sync()
+        with self._lock:
+            return digest in self._revoked
+
+
+claims_cache = ClaimsCache()
+revocation_list = RevocationList()
+
+
+def verify_token(token):
+    """decode_token with a claims cache and revocation check; raises jwt.InvalidTokenError subclasses."""
+    digest = token_digest(token)
+    if revocation_list.is_revoked(digest):
+        claims_cache.invalidate(digest)
+        raise jwt.InvalidTokenError("Token has been revoked")
+    claims = claims_cache.get(digest)
+    if claims is None:
+        claims = decode_token(token)
+        claims_cache.put(digest, claims)
+    return claims
+
+
+def revoke_token(token):
+    digest = revocation_list.revoke(token)
+    claims_cache.invalidate(digest)
@@ -0,0 +1,117 @@
+#utils/key_cache.py
+import hashlib
+import hmac
+import os
+import threading
+import time
+from collections import OrderedDict
+from dotenv import load_dotenv
+from utils.crypto_utils import decrypt_private_key
+from utils.metrics import registry, family
+
+load_dotenv()
+
+KEY_CACHE_MAX_ENTRIES = int(os.getenv("KEY_CACHE_MAX_ENTRIES", 1024))
+KEY_CACHE_TTL_SECONDS = float(os.getenv("KEY_CACHE_TTL_SECONDS", 900))
+
+
+class SigningKeyCache:
+    """Bounded LRU of unlocked private keys, keyed by account and a fingerprint of the secret that unlocked them."""
+
+    def __init__(self, max_entries=KEY_CACHE_MAX_ENTRIES, ttl=KEY_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # Per-process key so fingerprints are useless outside this process
+        self._fingerprint_key = os.urandom(32)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _fingerprint(self, secret: str, encrypted_pem: bytes, salt: bytes):
+        # Binding the ciphertext and salt means a re-keyed wallet never matches an old entry
+        msg = secret.encode() + b"\0" + salt + b"\0" + encrypted_pem
+        return hmac.new(self._fingerprint_key, msg, hashlib.sha256).digest()
+
+    def get_or_unlock(self, account_number, kind, encrypted_pem, secret, salt):
+        if not secret:
+            raise ValueError("Password cannot be None")
+
+        cache_key = (account_number, kind, self._fingerprint(secret, encrypted_pem, salt))
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None:
+                private_key, expires_at = entry
+                if expires_at > now:
+                    self._entries.move_to_end(cache_key)
+                    self.hits += 1
+                    return private_key
+                del self._entries[cache_key]
+                self.expirations += 1
+            self.misses += 1
+
+        # Only cache after decryption succeeds, so a wrong secret is never remembered
+        private_key = decrypt_private_key(encrypted_pem, secret, salt)
+
+        with self._lock:
+            self._entries[cache_key] = (private_key, time.monotonic() + self.ttl)
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return private_key
+
+    def invalidate(self, account_number, kind=None):
+        with self._lock:
+            stale = [k for k in self._entries if k[0] == account_number and (kind is None or k[1] == kind)]
+            for k in stale:
+                del self._entries[k]
+            return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+
+signing_key_cache = SigningKeyCache()
+
+
+def _key_cache_lines():
+    stats = signing_key_cache.stats()
+    return (family("key_cache_entries", "gauge", "Unlocked private keys held in memory", [({}, stats["entries"])])
+            + family("key_cache_lookups_total", "counter", "Signing key lookups by result",
+                     [({"result": "hit"}, stats["hits"]), ({"result": "miss"}, stats["misses"])])
+            + family("key_cache_evictions_total", "counter", "Keys dropped to stay under the size limit",
+                     [({}, stats["evictions"])])
+            + family("key_cache_expirations_total", "counter", "Keys dropped after their TTL",
+                     [({}, stats["expirations"])]))
+
+
+registry.add_collector(_key_cache_lines)
+
+
+def unlock_private_key(account_number, encrypted_pem, password, salt):
+    """Return the wallet's login private key, decrypting it only on a cache miss."""
+    return signing_key_cache.get_or_unlock(account_number, "login", encrypted_pem, password, salt)
+
+
+def unlock_private_pin_key(account_number, encrypted_pem, pin, salt):
+    """Return the wallet's PIN signing key, decrypting it only on a cache miss."""
+    return signing_key_cache.get_or_unlock(account_number, "pin", encrypted_pem, pin, salt)
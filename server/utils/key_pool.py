@@ -0,0 +1,126 @@
+#utils/key_pool.py
+import logging
+import os
+import threading
+import time
+from collections import deque
+from dotenv import load_dotenv
+from utils.crypto_utils import generate_keys
+from utils.metrics import registry, family
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+KEY_POOL_SIZE = int(os.getenv("KEY_POOL_SIZE", 8))
+KEY_POOL_RATE_WINDOW_SECONDS = float(os.getenv("KEY_POOL_RATE_WINDOW_SECONDS", 60))
+
+
+class KeyPairPool:
+    """Keeps up to `size` pre-generated RSA keypairs ready for signup and set-pin."""
+
+    def __init__(self, size=KEY_POOL_SIZE, rate_window=KEY_POOL_RATE_WINDOW_SECONDS):
+        self.size = size
+        self.rate_window = rate_window
+        self._keys = deque()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._running = False
+        self.hits = 0
+        self.misses = 0
+        self.generated = 0
+        self._created_at = time.monotonic()
+        # (finished_at, seconds) for refills within the rate window
+        self._recent = deque()
+
+    def start(self):
+        with self._cond:
+            if self._running or self.size <= 0:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._refill, name="key-pool", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join()
+
+    def take(self):
+        """Return a (private_key, public_key) pair, generating inline if the pool is empty."""
+        self.start()
+        with self._cond:
+            if self._keys:
+                pair = self._keys.popleft()
+                self.hits += 1
+                self._cond.notify()
+                return pair
+            self.misses += 1
+            self._cond.notify()
+        return generate_keys()
+
+    def _refill(self):
+        while True:
+            with self._cond:
+                while self._running and len(self._keys) >= self.size:
+                    self._cond.wait()
+                if not self._running:
+                    return
+            started = time.perf_counter()
+            try:
+                pair = generate_keys()
+            except Exception:
+                logger.exception("Key pool refill failed")
+                time.sleep(1)
+                continue
+            with self._cond:
+                self._keys.append(pair)
+                self.generated += 1
+                self._recent.append((time.monotonic(), time.perf_counter() - started))
+                self._prune(time.monotonic())
+
+    def _prune(self, now):
+        while self._recent and self._recent[0][0] < now - self.rate_window:
+            self._recent.popleft()
+
+    def stats(self):
+        with self._cond:
+            now = time.monotonic()
+            self._prune(now)
+            # Keys added per wall-clock second, over the window (or since start)
+            elapsed = min(self.rate_window, now - self._created_at)
+            busy = sum(seconds for _, seconds in self._recent)
+            return {
+                "depth": len(self._keys),
+                "size": self.size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "generated": self.generated,
+                "refill_rate_per_sec": len(self._recent) / elapsed if elapsed > 0 else 0.0,
+                "avg_generate_ms": busy / len(self._recent) * 1000 if self._recent else 0.0,
+            }
+
+
+key_pool = KeyPairPool()
+
+
+def _key_pool_lines():
+    stats = key_pool.stats()
+    return (family("key_pool_depth", "gauge", "Pre-generated keypairs ready", [({}, stats["depth"])])
+            + family("key_pool_size", "gauge", "Keypairs the pool refills up to", [({}, stats["size"])])
+            + family("key_pool_takes_total", "counter", "Keypairs taken, by whether the pool had one ready",
+                     [({"result": "hit"}, stats["hits"]), ({"result": "miss"}, stats["misses"])])
+            + family("key_pool_generated_total", "counter", "Keypairs generated by the refill thread",
+                     [({}, stats["generated"])])
+            + family("key_pool_refill_rate", "gauge",
+                     f"Keypairs added per second over the last {key_pool.rate_window:g}s",
+                     [({}, round(stats["refill_rate_per_sec"], 4))]))
+
+
+registry.add_collector(_key_pool_lines)
+
+
+def take_keys():
+    return key_pool.take()
@@ -0,0 +1,56 @@
+#utils/merkle.py
+import hashlib
+
+# Leaves and inner nodes are hashed with different prefixes so an inner node
+# can never be passed off as a transaction hash.
+LEAF_PREFIX = b"\x00"
+NODE_PREFIX = b"\x01"
+EMPTY_ROOT = "0" * 64
+
+
+def _leaf(tx_hash: str) -> bytes:
+    return hashlib.sha256(LEAF_PREFIX + bytes.fromhex(tx_hash)).digest()
+
+
+def _node(left: bytes, right: bytes) -> bytes:
+    return hashlib.sha256(NODE_PREFIX + left + right).digest()
+
+
+def _next_level(level):
+    if len(level) % 2:
+        level = level + [level[-1]]  # odd levels repeat their last node
+    return [_node(level[i], level[i + 1]) for i in range(0, len(level), 2)]
+
+
+def merkle_root(tx_hashes) -> str:
+    """Root over a block's transaction hashes, as hex."""
+    if not tx_hashes:
+        return EMPTY_ROOT
+    level = [_leaf(h) for h in tx_hashes]
+    while len(level) > 1:
+        level = _next_level(level)
+    return level[0].hex()
+
+
+def merkle_proof(tx_hashes, index: int):
+    """Sibling path from leaf `index` up to the root, as [{"hash", "position"}]."""
+    if not 0 <= index < len(tx_hashes):
+        raise IndexError("transaction index out of range")
+    level = [_leaf(h) for h in tx_hashes]
+    proof = []
+    while len(level) > 1:
+        if len(level) % 2:
+            level = level + [level[-1]]
+        sibling = index ^ 1
+        proof.append({"hash": level[sibling].hex(), "position": "left" if sibling < index else "right"})
+        level = _next_level(level)
+        index //= 2
+    return proof
+
+
+def verify_proof(tx_hash: str, proof, root: str) -> bool:
+    node = _leaf(tx_hash)
+    for step in proof:
+        sibling = bytes.fromhex(step["hash"])
+        node = _node(sibling, node) if step["position"] == "left" else _node(node, sibling)
+    return node.hex() == root
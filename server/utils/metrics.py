@@ -0,0 +1,218 @@
+#utils/metrics.py
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from flask import g, has_request_context
+from pymongo import monitoring
+from utils.pool_metrics import pool_metrics
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Gauge(Counter):
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+    def render(self):
+        lines = super().render()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+
+class Histogram:
+    """Fixed-bucket histogram; observe() is one bisect and a few adds under a lock."""
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, (counts, total, count) in sorted(self._series.items()):
+                running = 0
+                for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                    running += bucket_count
+                    le = 'le="%s"' % bound
+                    lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {running}")
+                lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {total}")
+                lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+def family(name, kind, documentation, samples):
+    """Exposition lines for one metric whose values live elsewhere; samples are (labels dict, value) pairs."""
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        lines.append(f"{name}{_labels(labels.keys(), labels.values())} {value}")
+    return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector):
+        """collector() returns exposition lines, for values owned elsewhere (e.g. pool stats)."""
+        self._collectors.append(collector)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            lines.extend(collector())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_request_seconds = registry.register(Histogram(
+    "http_request_duration_seconds", "Request latency by route", ("method", "route", "status")))
+crypto_seconds = registry.register(Histogram(
+    "crypto_operation_duration_seconds", "Crypto executor time by operation and phase", ("op", "phase")))
+mongo_command_seconds = registry.register(Histogram(
+    "mongo_command_duration_seconds", "MongoDB command latency", ("command",)))
+mongo_command_failures = registry.register(Counter(
+    "mongo_command_failures_total", "Failed MongoDB commands", ("command",)))
+span_seconds = registry.register(Histogram(
+    "span_duration_seconds", "Named code spans", ("span",)))
+mining_seconds = registry.register(Histogram(
+    "mining_block_duration_seconds", "Proof-of-work time per block", ("difficulty",),
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)))
+mining_hashes = registry.register(Counter(
+    "mining_hashes_total", "Nonces tried (serial-equivalent) while mining", ("difficulty",)))
+mining_hash_rate = registry.register(Gauge(
+    "mining_hash_rate", "Hashes per second of the most recent block", ("difficulty",)))
+
+
+def add_to_request(component, seconds):
+    """Charge time to the current request's breakdown (reported in Server-Timing)."""
+    if has_request_context():
+        breakdown = g.setdefault("timing_breakdown", {})
+        entry = breakdown.setdefault(component, [0.0, 0])
+        entry[0] += seconds
+        entry[1] += 1
+
+
+@contextmanager
+def span(name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        span_seconds.observe(elapsed, name)
+        add_to_request(name, elapsed)
+
+
+def observe_crypto(op, wait, run):
+    crypto_seconds.observe(wait, op, "wait")
+    crypto_seconds.observe(run, op, "run")
+    add_to_request("crypto", wait + run)
+
+
+def observe_mining(difficulty, hashes, elapsed):
+    mining_seconds.observe(elapsed, str(difficulty))
+    mining_hashes.inc(str(difficulty), amount=hashes)
+    if elapsed > 0:
+        mining_hash_rate.set(round(hashes / elapsed, 1), str(difficulty))
+
+
+class CommandMetrics(monitoring.CommandListener):
+    """Times every MongoDB command from the driver's own measurements."""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        seconds = event.duration_micros / 1e6
+        mongo_command_seconds.observe(seconds, event.command_name)
+        add_to_request("db", seconds)
+
+    def failed(self, event):
+        mongo_command_seconds.observe(event.duration_micros / 1e6, event.command_name)
+        mongo_command_failures.inc(event.command_name)
+
+
+command_metrics = CommandMetrics()
+
+
+def _pool_lines():
+    snapshot = pool_metrics.snapshot()
+    name = "mongo_pool_checkout_wait_seconds"
+    lines = [f"# HELP {name} Time spent waiting for a pooled MongoDB connection", f"# TYPE {name} histogram"]
+    for bucket, count in snapshot["wait_buckets"].items():
+        bound = bucket[3:]
+        le = "+Inf" if bound == "inf" else int(bound) / 1000
+        lines.append(f'{name}_bucket{{le="{le}"}} {count}')
+    lines.append(f"{name}_sum {snapshot['wait_avg_ms'] * snapshot['checkouts'] / 1000}")
+    lines.append(f"{name}_count {snapshot['checkouts']}")
+    lines += ["# HELP mongo_pool_connections_in_use Connections checked out of the pool",
+              "# TYPE mongo_pool_connections_in_use gauge",
+              f"mongo_pool_connections_in_use {snapshot['in_use']}",
+              "# HELP mongo_pool_connections_open Open pooled connections",
+              "# TYPE mongo_pool_connections_open gauge",
+              f"mongo_pool_connections_open {snapshot['open_connections']}"]
+    return lines
+
+
+registry.add_collector(_pool_lines)
+
+
+def server_timing():
+    """Server-Timing entries for the current request's breakdown."""
+    breakdown = g.get("timing_breakdown", {})
+    return [f'{name};dur={round(seconds * 1000, 3)};desc="{count} calls"'
+            for name, (seconds, count) in sorted(breakdown.items())]
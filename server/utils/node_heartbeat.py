@@ -0,0 +1,73 @@
+#utils/node_heartbeat.py
+import atexit
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from pymongo.errors import PyMongoError
+from dotenv import load_dotenv
+from db import nodes_collection
+from utils.id_generator import NODE_ID
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+NODE_HEARTBEAT_TTL_SECONDS = int(os.getenv("NODE_HEARTBEAT_TTL_SECONDS", 30))
+
+
+class NodeHeartbeat:
+    """Advertises that this process is alive.
+
+    Other nodes only adopt the pending transactions of a node whose
+    heartbeat has lapsed. A node that stalls past its TTL may lose its
+    transactions to another node; the claim taken before mining (see
+    Blockchain._claim) then keeps it from mining them as well.
+    """
+
+    def __init__(self, collection, node, ttl=NODE_HEARTBEAT_TTL_SECONDS):
+        self.collection = collection
+        self.node = node
+        self.ttl = ttl
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def beat(self):
+        self.collection.update_one(
+            {"_id": self.node},
+            {"$set": {"expires_at": datetime.now(timezone.utc) + timedelta(seconds=self.ttl)}},
+            upsert=True)
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self.beat()
+            self._thread = threading.Thread(target=self._run, name="node-heartbeat", daemon=True)
+            self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        # Let others adopt our leftovers right away instead of after the TTL
+        try:
+            self.collection.delete_one({"_id": self.node})
+        except PyMongoError:
+            pass
+
+    def _run(self):
+        while True:
+            time.sleep(self.ttl / 3)
+            try:
+                self.beat()
+            except PyMongoError:
+                logger.exception("Node heartbeat failed")
+
+    def live_nodes(self, nodes):
+        """The subset of nodes whose heartbeat has not expired."""
+        docs = self.collection.find({"_id": {"$in": list(nodes)}, "expires_at": {"$gt": datetime.now(timezone.utc)}},
+                                    {"_id": 1})
+        return {doc["_id"] for doc in docs}
+
+
+node_heartbeat = NodeHeartbeat(nodes_collection, NODE_ID)
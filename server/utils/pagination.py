@@ -0,0 +1,36 @@
+#utils/pagination.py
+import base64
+import calendar
+import json
+from datetime import datetime, timezone
+from bson import ObjectId
+from bson.errors import InvalidId
+
+
+class InvalidCursorError(ValueError):
+    pass
+
+
+def encode_cursor(timestamp, object_id):
+    """Opaque keyset cursor for the (timestamp, _id) of the last row on a page."""
+    ms = calendar.timegm(timestamp.utctimetuple()) * 1000 + timestamp.microsecond // 1000
+    raw = json.dumps({"t": ms, "id": str(object_id)}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw)
+        # MongoDB stores UTC milliseconds; naive UTC matches what the driver returns
+        timestamp = datetime.fromtimestamp(data["t"] / 1000, tz=timezone.utc).replace(tzinfo=None)
+        return timestamp, ObjectId(data["id"])
+    except (ValueError, KeyError, TypeError, InvalidId) as e:
+        raise InvalidCursorError("Invalid cursor") from e
+
+
+def parse_date(value):
+    """Parse an ISO date or datetime query parameter; None passes through."""
+    if not value:
+        return None
+    return datetime.fromisoformat(value)
@@ -0,0 +1,101 @@
+#utils/pool_metrics.py
+import threading
+import time
+from bisect import bisect_left
+from pymongo import monitoring
+
+# Upper bounds (ms) of the checkout wait histogram; the last bucket is open-ended
+WAIT_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """CMAP listener recording how long operations wait for a pooled connection.
+
+    A wait that keeps growing means maxPoolSize is too small for the load
+    (or the server is slow to hand connections back).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.checkouts = 0
+        self.failures = {}
+        self.wait_total_ms = 0.0
+        self.wait_max_ms = 0.0
+        self.wait_buckets = [0] * (len(WAIT_BUCKETS_MS) + 1)
+        self.in_use = 0
+        self.open_connections = 0
+        self.pool_clears = 0
+
+    def _wait_ms(self, event):
+        # pymongo >= 4.7 reports the duration; older drivers need our own clock
+        duration = getattr(event, "duration", None)
+        if duration is not None:
+            return duration * 1000
+        started = getattr(self._local, "started", None)
+        return (time.perf_counter() - started) * 1000 if started is not None else 0.0
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        wait_ms = self._wait_ms(event)
+        with self._lock:
+            self.checkouts += 1
+            self.in_use += 1
+            self.wait_total_ms += wait_ms
+            self.wait_max_ms = max(self.wait_max_ms, wait_ms)
+            self.wait_buckets[bisect_left(WAIT_BUCKETS_MS, wait_ms)] += 1
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.failures[event.reason] = self.failures.get(event.reason, 0) + 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.in_use -= 1
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open_connections += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open_connections -= 1
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pool_clears += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def snapshot(self):
+        with self._lock:
+            # Cumulative, like a Prometheus histogram
+            buckets, running = {}, 0
+            for bound, count in zip(WAIT_BUCKETS_MS + ("inf",), self.wait_buckets):
+                running += count
+                buckets[f"le_{bound}"] = running
+            return {
+                "checkouts": self.checkouts,
+                "checkout_failures": dict(self.failures),
+                "wait_avg_ms": self.wait_total_ms / self.checkouts if self.checkouts else 0.0,
+                "wait_max_ms": self.wait_max_ms,
+                "wait_buckets": buckets,
+                "in_use": self.in_use,
+                "open_connections": self.open_connections,
+                "pool_clears": self.pool_clears,
+            }
+
+
+pool_metrics = PoolMetrics()
@@ -0,0 +1,15 @@
+#validate_chain.py
+import argparse
+import json
+from models.chain_validator import ChainValidator
+from models.signature_verifier import SignatureVerifier, VERIFY_WORKERS
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Validate proof-of-work, links and signatures of the stored chain.")
+    parser.add_argument("--full", action="store_true", help="ignore the checkpoint and revalidate from genesis")
+    parser.add_argument("--workers", type=int, default=VERIFY_WORKERS, help="signature verification threads")
+    args = parser.parse_args()
+
+    report = ChainValidator(verifier=SignatureVerifier(workers=args.workers)).run(full=args.full)
+    print(json.dumps(report, indent=2, default=str))
+    raise SystemExit(0 if report["valid"] else 1)